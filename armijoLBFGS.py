@@ -5,16 +5,16 @@ import numpy as np
 from utility import linesearch, parameters, limitedMemory
 
 
-def solve(f, Df, x):
+def solve(oracle, x, tracer=None):
     """Monotone L-BFGS algorithm with Armijo line search."""
     lmData = limitedMemory.LmData(x.shape[0], parameters.memory)
-    return linesearch.genericMonotone(lmData, updateLmData, inverseBFGS, armijo, f, Df, x)
+    return linesearch.genericMonotone(lmData, updateLmData, inverseBFGS, armijo, oracle, x, tracer)
 
 
-def solveNonmonotone(f, Df, x):
+def solveNonmonotone(oracle, x, history=None, tracer=None):
     """Nonmonotone L-BFGS algorithm with Armijo line search."""
     lmData = limitedMemory.LmData(x.shape[0], parameters.memory)
-    return linesearch.genericNonmonotone(lmData, updateLmData, inverseBFGS, armijo, f, Df, x)
+    return linesearch.genericNonmonotone(lmData, updateLmData, inverseBFGS, armijo, oracle, x, history, tracer)
 
 
 def updateLmData(lmData, sn, yn):
@@ -30,23 +30,27 @@ def updateLmData(lmData, sn, yn):
 
 def inverseBFGS(data, g):
     """Compute L-BFGS step."""
-    return limitedMemory.twoLoopRecursion(data.S, data.Y, data.sty, data.mUpd, data.gamma, -g)
+    d = np.negative(g, out=data.workspace('d'))
+    return limitedMemory.twoLoopRecursion(data.S, data.Y, data.sty, data.order(), data.gamma, d, d,
+        data.workspace('tmp'))
 
 
-def armijo(x, f, Df, d, fx, gx):
+def armijo(x, oracle, d, fx, gx, workspace):
     """Armijo line search."""
-    it, t, dtgx, xn = 1, 1.0, np.dot(d,gx), x + d
-    fn = f(xn)
+    it, t, dtgx, xn = 1, 1.0, np.dot(d,gx), np.add(x, d, out=workspace('xtry'))
+    fn = oracle.value(xn)
     while fn > fx + 1e-4 * t *dtgx and t >= parameters.minStep:
         t *= 0.5
         it += 1
-        xn = x + t * d
-        fn = f(xn)
+        np.multiply(d, t, out=xn)
+        xn += x
+        fn = oracle.value(xn)
     
     if t < parameters.minStep:
         # Unsuccessful
         return x, False, fx, gx, it, np.zeros_like(d), np.zeros_like(gx)
     else:
         # Successful
-        gn = Df(xn)
-        return xn, True, fn, gn, it, t * d, gn - gx
+        gn = oracle.gradient(xn)
+        sn = np.multiply(d, t, out=workspace('s'))
+        return xn, True, fn, gn, it, sn, np.subtract(gn, gx, out=workspace('y'))
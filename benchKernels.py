@@ -0,0 +1,141 @@
+"""
+Microbenchmark of the limited-memory kernels.
+
+Every kernel is timed on limited-memory data filled with synthetic
+curvature pairs for a grid of dimensions n and memory sizes m. For each
+configuration (and storage precision of the pairs) the median time per
+call (after warmup) is reported along with leading-order estimates of the
+bytes moved and the achieved GFLOP/s.
+The direction calculators are timed for a new gradient ('cold', caches
+cleared) and for a repeated gradient with a new mu ('rejected', as after
+a rejected regularization step). With --scratch, the pairs are kept in
+memory-mapped files in the given directory.
+
+Usage: python benchKernels.py [--dims 100 1000 ...] [--memories 3 5 ...] [--dtypes float64 float32]
+                              [--scratch DIR]
+"""
+import argparse
+import csv
+import time
+import numpy as np
+from utility import limitedMemory
+
+import regLBFGS
+import regLBFGSsec
+import regLSR1
+import regLPSB
+
+
+def fillData(data, rng, count):
+    """Perform count updates with synthetic pairs satisfying s^T y > 0."""
+    for _ in range(count):
+        s = rng.standard_normal(data.n)
+        y = s * rng.uniform(1, 10, data.n) + 0.1 * rng.standard_normal(data.n)
+        data.update(s, y, np.dot(y, y) / np.dot(s, y))
+
+
+def directionKernel(direction):
+    """Benchmark setup for a direction calculator direction(data, mu, g)."""
+    def setup(data, g):
+        def cold():
+            data.cache.clear()
+            direction(data, 1.0, g)
+        mus = iter(np.geomspace(1, 1e6, 1_000_000))
+        def rejected():
+            direction(data, next(mus), g)
+        return {'cold': cold, 'rejected': rejected}
+    return setup
+
+
+def twoLoopKernel(data, g):
+    return {'cold': lambda: limitedMemory.twoLoopRecursion(
+        data.S, data.Y, data.sty, data.order(), data.gamma, -g)}
+
+
+def updateKernel(data, g):
+    rng = np.random.default_rng(1)
+    s = rng.standard_normal(data.n)
+    y = 2 * s
+    return {'cold': lambda: data.update(s, y, 2.0)}
+
+
+# name: (data structure, setup, flops(n, m), (stored pair entries, doubles) moved(n, m))
+kernels = {
+    'regLBFGS.inverseLBFGS': (limitedMemory.NormalizedLmData, directionKernel(regLBFGS.inverseLBFGS),
+        lambda n, m: 8*m*n, lambda n, m: (4*m*n, 4*n)),
+    'regLBFGSsec.calculateStep': (limitedMemory.LmData, directionKernel(regLBFGSsec.calculateStep),
+        lambda n, m: 10*m*n, lambda n, m: (6*m*n, 7*m*n + 2*n)),
+    'regLBFGSsec.calculateStepCompact': (limitedMemory.ExtendedLmData, directionKernel(regLBFGSsec.calculateStepCompact),
+        lambda n, m: 8*m*n, lambda n, m: (4*m*n, 4*n)),
+    'regLSR1.inverseLSR1': (limitedMemory.ExtendedLmData, directionKernel(regLSR1.inverseLSR1),
+        lambda n, m: 8*m*n, lambda n, m: (4*m*n, 4*n)),
+    'regLPSB.inverseLPSB': (limitedMemory.ExtendedLmData, directionKernel(regLPSB.inverseLPSB),
+        lambda n, m: 8*m*n, lambda n, m: (4*m*n, 4*n)),
+    'limitedMemory.twoLoopRecursion': (limitedMemory.LmData, twoLoopKernel,
+        lambda n, m: 8*m*n, lambda n, m: (4*m*n, 6*m*n + 2*n)),
+    'LmData.update': (limitedMemory.LmData, updateKernel,
+        lambda n, m: 6*n, lambda n, m: (2*n, 4*n)),
+    'ExtendedLmData.update': (limitedMemory.ExtendedLmData, updateKernel,
+        lambda n, m: 8*m*n, lambda n, m: (4*m*n + 2*n, 2*n)),
+    'NormalizedLmData.update': (limitedMemory.NormalizedLmData, updateKernel,
+        lambda n, m: 8*m*n + 10*n, lambda n, m: (4*m*n + 2*n, 8*n)),
+}
+
+
+def timeCall(fun, warmup, reps):
+    """Median and minimum time per call."""
+    for _ in range(warmup):
+        fun()
+    times = np.empty(reps)
+    for r in range(reps):
+        tic = time.perf_counter()
+        fun()
+        times[r] = time.perf_counter() - tic
+    return np.median(times), np.min(times)
+
+
+def run(dims, memories, dtypes, names, warmup, reps, maxBytes, output, scratch=None):
+    rng = np.random.default_rng(0)
+    storage = 'ram' if scratch is None else 'mmap'
+    with open(output, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['kernel', 'variant', 'dtype', 'storage', 'n', 'm', 'median_s', 'min_s', 'bytes', 'GBps', 'GFLOPps'])
+        for n in dims:
+            for m in memories:
+                g = rng.standard_normal(n)
+                for dtype in dtypes:
+                    itemsize = np.dtype(dtype).itemsize
+                    if 2 * itemsize * n * m > maxBytes:
+                        print(f"Skipping n={n}, m={m}, {dtype} (exceeds --max-bytes)")
+                        continue
+                    for name in names:
+                        lmClass, setup, flops, moved = kernels[name]
+                        data = lmClass(n, m, dtype, scratch)
+                        fillData(data, rng, m + 1)
+                        pairEntries, doubles = moved(n, m)
+                        nbytes = itemsize * pairEntries + 8 * doubles
+                        for variant, fun in setup(data, g).items():
+                            median, best = timeCall(fun, warmup, reps)
+                            writer.writerow([name, variant, dtype, storage, n, m, f"{median:.6e}", f"{best:.6e}",
+                                nbytes, f"{nbytes / median / 1e9:.3f}", f"{flops(n, m) / median / 1e9:.3f}"])
+                            print(f"{name:32s} {variant:8s} {dtype:7s} {storage:4s} n={n:<9d} m={m:<3d} "
+                                  f"{median*1e3:10.4f} ms {flops(n, m) / median / 1e9:8.3f} GFLOP/s")
+                        file.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dims', type=int, nargs='+', default=[10**k for k in range(2, 8)])
+    parser.add_argument('--memories', type=int, nargs='+', default=[3, 5, 10, 20, 50])
+    parser.add_argument('--dtypes', nargs='+', default=['float64'], choices=['float64', 'float32'],
+        help="storage precision of the pairs")
+    parser.add_argument('--kernels', nargs='+', default=list(kernels), choices=list(kernels))
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--reps', type=int, default=10)
+    parser.add_argument('--max-bytes', type=float, default=4e9,
+        help="skip configurations whose S and Y need more memory")
+    parser.add_argument('--scratch', help="keep the pairs in memory-mapped files in this directory")
+    parser.add_argument('--output', default='results/benchKernels.csv')
+    args = parser.parse_args()
+    run(args.dims, args.memories, args.dtypes, args.kernels, args.warmup, args.reps, args.max_bytes, args.output,
+        args.scratch)
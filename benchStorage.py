@@ -0,0 +1,124 @@
+"""
+Effect of the storage of the limited-memory pairs on the solvers.
+
+All algorithms and modes of testAllAndSave.py are run on the built-in
+problems (utility/builtinProblems.py) once per storage of the pairs:
+float64 and float32 in RAM and float64 memory-mapped in a scratch
+directory (parameters.lmDtype and parameters.lmScratch). Every storage is
+a run of the results store (utility/results.py) whose record holds the
+storage and the dimension, and every cell is appended to it as soon as it
+completes; the tables of one storage are read with, e.g.,
+store.table(mode, algorithms, 'nf', runs=store.runs(storage='float32')).
+The totals of nf and time over the problems solved with all storages are
+printed per algorithm and mode.
+
+All problems have the same dimension, so the worker processes and BLAS
+threads per process are chosen once from it (utility/threads.py) and set
+before NumPy is imported; the layout is part of every run record.
+
+Usage: python benchStorage.py [--dimension N] [--repeats R] [--timeout S] [--scratch DIR]
+                              [--store results/benchStorage/store]
+"""
+import argparse
+import tempfile
+import time
+from utility import threads
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--dimension', type=int, default=100000, help="dimension of the built-in problems")
+    parser.add_argument('--repeats', type=int, default=3, help="timed runs per cell (the fastest is reported)")
+    parser.add_argument('--timeout', type=float, default=600, help="wall-clock limit per cell in seconds")
+    parser.add_argument('--scratch', default=tempfile.gettempdir(), help="directory of the memory-mapped pairs")
+    parser.add_argument('--store', default='results/benchStorage/store', help="results store to append to")
+    args = parser.parse_args()
+    dimension, repeats, scratch = args.dimension, args.repeats, args.scratch
+    # The workers inherit the limit, so it must precede the import of NumPy
+    nProcesses, blasThreads = threads.layout(dimension)
+    threads.limit(blasThreads)
+    print(f"Using {nProcesses} processes x {blasThreads} BLAS threads")
+
+import numpy as np
+from utility import builtinProblems, oracle, parameters, results, scheduler
+
+import regLBFGS
+import regLBFGSsec
+import regLSR1
+import regLPSB
+import armijoLBFGS
+import wolfeLBFGS
+
+
+algorithms = regLBFGS, armijoLBFGS, wolfeLBFGS, regLBFGSsec, regLSR1, regLPSB
+modes = 'solve', 'solveNonmonotone'
+
+# Storage name: (dtype of the pairs, memory-mapped)
+storages = {
+    'float64': ('float64', False),
+    'float32': ('float32', False),
+    'float64-mmap': ('float64', True),
+}
+
+
+def loadProblem(problem):
+    return builtinProblems.import_problem(problem, dimension)
+
+
+def solveTask(problem, task):
+    """Solve one cell repeats times with the storage of the task and return the fastest run."""
+    _, storage, a, m = task
+    parameters.lmDtype, mapped = storages[storage]
+    parameters.lmScratch = scratch if mapped else None
+    best = np.inf
+    for _ in range(repeats):
+        prob = oracle.fromPycutest(problem)
+        tic = time.perf_counter()
+        x, (it, nf) = getattr(algorithms[a], modes[m])(prob, problem.x0)
+        best = min(best, time.perf_counter() - tic)
+    fx, gx = prob.valueAndGradient(x)
+    return {'n': problem.n, 'nf': int(nf), 'iter': int(it), 'fx': float(fx),
+        'opt': float(np.linalg.norm(gx, np.inf)), 'time': best}
+
+
+def summarize(store, runs):
+    """Print the totals over the problems solved with all storages, relative to the first storage."""
+    problems = list(builtinProblems.definitions)
+    names = [a.__name__ for a in algorithms]
+    print(f"{'algorithm':12s} {'mode':17s} {'storage':13s} {'solved':>6s} {'nf':>8s} {'time':>9s} "
+          f"{'nf ratio':>8s} {'time ratio':>10s}")
+    for m in modes:
+        tables = {storage: store.table(m, names, 'nf', 'opt', 'time', problems=problems, runs=[run])
+            for storage, run in runs.items()}
+        solved = {storage: opt <= parameters.tolGrad for storage, (nf, opt, runtime) in tables.items()}
+        common = np.logical_and.reduce(list(solved.values()))
+        for i, a in enumerate(names):
+            reference = None
+            for storage, (nf, opt, runtime) in tables.items():
+                total = np.sum(nf[i, common[i]]), np.sum(runtime[i, common[i]])
+                reference = total if reference is None else reference
+                print(f"{a:12s} {m:17s} {storage:13s} {np.sum(solved[storage][i]):6d} {total[0]:8.0f} "
+                      f"{total[1]:9.3f} {total[0] / max(reference[0], 1):8.3f} "
+                      f"{total[1] / max(reference[1], 1e-12):10.3f}")
+
+
+if __name__ == '__main__':
+    store = results.Store(args.store)
+    runs = {storage: store.newRun(source='benchStorage.py', storage=storage, lmDtype=dtype, mapped=mapped,
+        dimension=dimension, repeats=repeats, processes=nProcesses, blasThreads=blasThreads,
+        cores=threads.cores()) for storage, (dtype, mapped) in storages.items()}
+    tasks = [(problem, storage, a, m) for problem in builtinProblems.definitions
+        for a in range(len(algorithms)) for m in range(len(modes)) for storage in storages]
+
+    def report(task, result, error):
+        """Append a completed cell to the run of its storage; failed cells get nf = inf and a reason."""
+        problem, storage, a, m = task
+        if error is not None:
+            print(f"{algorithms[a].__name__}.{modes[m]} on {problem} ({storage}) failed: "
+                  f"{error.strip().splitlines()[-1]}")
+            result = {'n': dimension, 'nf': np.inf, 'iter': -1, 'fx': np.nan, 'opt': np.nan,
+                'time': args.timeout if error.startswith('Timeout') else np.nan,
+                'reason': error.strip().splitlines()[-1]}
+        store.append(runs[storage], modes[m], algorithms[a].__name__, problem, **result)
+
+    scheduler.Scheduler(loadProblem, solveTask, nProcesses, timeout=args.timeout).run(tasks, report)
+    summarize(store, runs)
@@ -0,0 +1,55 @@
+"""
+Build all benchmark problems into the persistent pycutest cache.
+
+The problems are decoded and compiled in parallel, and the build status,
+dimension and build time of every problem are recorded in the manifest
+(see utility/problems.py). Problems which were already built successfully
+are skipped unless --rebuild is given.
+
+Usage: python prepareProblems.py [--workers N] [--rebuild] [PROBLEM ...]
+"""
+import argparse
+import multiprocessing
+import time
+import traceback
+from utility import problems
+problems.useCache()
+import pycutest
+
+
+def buildProblem(problem):
+    """Build (or load) a problem and return its manifest entry."""
+    tic = time.perf_counter()
+    try:
+        prob = pycutest.import_problem(problem)
+        entry = {'status': 'ok', 'n': int(prob.n)}
+    except Exception:
+        entry = {'status': 'failed', 'error': traceback.format_exc()}
+    entry['time'] = time.perf_counter() - tic
+    return problem, entry
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('problems', nargs='*', default=problems.problemsToRun())
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--rebuild', action='store_true')
+    args = parser.parse_args()
+
+    manifest = problems.loadManifest()
+    toBuild = args.problems if args.rebuild else problems.missingProblems(args.problems)
+    if args.rebuild:
+        for problem in toBuild:
+            if manifest.get(problem, {}).get('status') == 'ok':
+                pycutest.clear_cache(problem)
+    print(f"Building {len(toBuild)} of {len(args.problems)} problems")
+
+    with multiprocessing.Pool(args.workers) as pool:
+        for problem, entry in pool.imap_unordered(buildProblem, toBuild):
+            manifest[problem] = entry
+            problems.writeManifest(manifest)
+            print(f"{problem}: {entry['status']} ({entry['time']:0.1f} seconds)")
+
+    failed = [p for p in args.problems if manifest[p]['status'] != 'ok']
+    if failed:
+        print(f"Failed to build: {', '.join(failed)}")
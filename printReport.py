@@ -0,0 +1,102 @@
+"""
+Render all performance profiles from one load of the results store.
+
+The figures of testPrintProfile1.py and testPrintProfile2.py (and their
+time-based variants) are written to the output directory without opening
+a display (Agg backend). The staircase of every profile is also exported
+as <figure>.npz with arrays theta<i>, prob<i> for the profiles i that solve
+a problem within the plotted range, their indices and their labels. With
+--no-plots, only the staircases are exported and matplotlib is not needed.
+
+Usage: python printReport.py [--store results/store] [--output figures] [--no-plots]
+"""
+import argparse
+import os
+import numpy as np
+from utility import parameters
+from utility import perfprof
+from utility import results
+
+
+modes = 'solve', 'solveNonmonotone'
+group1 = 'regLBFGS', 'regLBFGSsec', 'regLSR1', 'regLPSB'
+group2 = 'regLBFGS', 'armijoLBFGS', 'wolfeLBFGS'
+algorithms = 'regLBFGS', 'regLBFGSsec', 'regLSR1', 'regLPSB', 'armijoLBFGS', 'wolfeLBFGS', 'eigLBFGS'
+
+# Figure name, metric, and (mode, algorithm) of the profiles shown
+M, N = modes
+figures = [
+    ('Monotone1', 'nf', [(M, a) for a in group1]),
+    ('Nonmonotone1', 'nf', [(N, a) for a in group1]),
+    ('All11', 'nf', [(M, a) for a in group1[:2]] + [(N, a) for a in group1[:2]]),
+    ('All12', 'nf', [(M, a) for a in group1[2:]] + [(N, a) for a in group1[2:]]),
+    ('Monotone2', 'nf', [(M, a) for a in group2 + ('eigLBFGS',)]),
+    ('Nonmonotone2', 'nf', [(N, a) for a in group2]),
+    ('All21', 'nf', [(M, a) for a in group2[1:]] + [(N, a) for a in group2[1:]]),
+    ('All22', 'nf', [(M, 'regLBFGS'), (M, 'eigLBFGS'), (N, 'regLBFGS')]),
+    ('MonotoneTime1', 'time', [(M, a) for a in group1]),
+    ('NonmonotoneTime1', 'time', [(N, a) for a in group1]),
+    ('MonotoneTime2', 'time', [(M, a) for a in group2]),
+    ('NonmonotoneTime2', 'time', [(N, a) for a in group2]),
+]
+palette = ['o-r', 'o:b', 'o--c', 'o-.g', 'o:k', 'o-y', 'o:m', 'o--b']
+
+
+def loadMetrics(store):
+    """Metrics of all algorithms and modes, with Inf for unsolved problems."""
+    metrics = {}
+    for mode in modes:
+        available = [a for a in algorithms if a in store.meta['algorithm']]
+        nf, opt, time = store.table(mode, available, 'nf', 'opt', 'time')
+        unsolved = ~(opt <= parameters.tolGrad)
+        nf[unsolved] = np.inf
+        time[unsolved] = np.inf
+        for i, a in enumerate(available):
+            metrics[mode, a, 'nf'] = nf[i]
+            metrics[mode, a, 'time'] = time[i]
+    return metrics
+
+
+def label(mode, algorithm):
+    return algorithm if mode == 'solve' else rf'{algorithm}$_n$'
+
+
+def render(metrics, output, plots):
+    plt = perfprof.pyplot(headless=True) if plots else None
+    for name, metric, profiles in figures:
+        if any((mode, a, metric) not in metrics for mode, a in profiles):
+            print(f"Skipping {name} (missing results)")
+            continue
+        data = np.vstack([metrics[mode, a, metric] for mode, a in profiles]).T
+        if not np.any(np.isfinite(data)):
+            print(f"Skipping {name} (no {metric} data)")
+            continue
+        labels = [label(mode, a) for mode, a in profiles]
+
+        thmax, curves = perfprof.staircases(data, thmax=5.)
+        # Profiles without a curve (no problem solved within thmax) are not drawn
+        kept = [i for i, curve in enumerate(curves) if curve is not None]
+        arrays = {}
+        for i in kept:
+            arrays[f"theta{i}"], arrays[f"prob{i}"] = curves[i]
+        np.savez(os.path.join(output, f"{name}.npz"), labels=[labels[i] for i in kept],
+            indices=np.array(kept, dtype=int), **arrays)
+
+        if plots:
+            plt.figure()
+            _, h = perfprof.perfprof(data, linestyle=palette, thmax=thmax, curves=curves,
+                markersize=4, markevery=[0])
+            plt.legend([h[i][0] for i in kept], [labels[i] for i in kept], loc=4, fontsize=16)
+            plt.savefig(os.path.join(output, f"{name}.pdf"), bbox_inches='tight', pad_inches=0)
+            plt.close()
+        print(f"Rendered {name}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--store', default='results/store')
+    parser.add_argument('--output', default='figures')
+    parser.add_argument('--no-plots', action='store_true', help="only export the staircases")
+    args = parser.parse_args()
+    os.makedirs(args.output, exist_ok=True)
+    render(loadMetrics(results.load(args.store)), args.output, not args.no_plots)
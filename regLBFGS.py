@@ -3,18 +3,34 @@ Monotone and nonmonotone regularized L-BFGS methods.
 """
 import numpy as np
 import scipy.linalg
-from utility import regularization, parameters, limitedMemory
+from utility import regularization, parameters, limitedMemory, nonmonotone
 
 
-def solve(f, Df, x):
+def solve(oracle, x, tracer=None):
     "Monotone regularized L-BFGS method."
     lmData = limitedMemory.NormalizedLmData(x.shape[0], parameters.memory)
-    return regularization.genericMonotone(lmData, updateLmData, inverseLBFGS, f, Df, x)
+    return regularization.genericMonotone(lmData, updateLmData, inverseLBFGS, oracle, x, tracer)
 
-def solveNonmonotone(f, Df, x):
+def solveNonmonotone(oracle, x, history=None, tracer=None):
     "Nonmonotone regularized L-BFGS method."
     lmData = limitedMemory.NormalizedLmData(x.shape[0], parameters.memory)
-    return regularization.genericNonmonotone(lmData, updateLmData, inverseLBFGS, f, Df, x)
+    return regularization.genericNonmonotone(lmData, updateLmData, inverseLBFGS, oracle, x, history, tracer)
+
+
+def solveBatch(F, X):
+    """Monotone regularized L-BFGS method for a batch of instances (rows of X)."""
+    lmData = limitedMemory.BatchLmData(X.shape[0], X.shape[1], parameters.memory)
+    return regularization.genericBatch(lmData, updateBatchLmData, inverseLBFGSBatch, F, X)
+
+def solveBatchNonmonotone(F, X, histories=None):
+    """
+    Nonmonotone regularized L-BFGS method for a batch of instances (rows of X)
+    with one history per instance (the rule of the parameters file by default).
+    """
+    lmData = limitedMemory.BatchLmData(X.shape[0], X.shape[1], parameters.memory)
+    if histories is None:
+        histories = [nonmonotone.default() for _ in range(X.shape[0])]
+    return regularization.genericBatch(lmData, updateBatchLmData, inverseLBFGSBatch, F, X, histories)
 
 
 def updateLmData(data, sn, yn):
@@ -29,26 +45,92 @@ def updateLmData(data, sn, yn):
 
 def inverseLBFGS(data, mu, g):
     """Compute regularized L-BFGS step."""
-    mUpd = data.mUpd
     gamma = data.gamma
     gammah = data.gamma + mu
+    cache = cachedData(data)
 
-    Q11 = gammah * np.diag(data.sty[:mUpd] / data.yty[:mUpd]) + data.YnTYn[:mUpd, :mUpd]
-    Q21 = np.triu(data.SnTYn[:mUpd, :mUpd]) - mu/gamma * np.tril(data.SnTYn[:mUpd, :mUpd], -1)
-    Q22 = -mu/gamma * data.SnTSn[:mUpd, :mUpd]
+    Q11 = gammah * np.diag(cache['DnTDn']) + data.cachedLogical('YnTYn')
+    Q21 = cache['SnTYnU'] - mu/gamma * cache['SnTYnL']
+    Q22 = -mu/gamma * data.cachedLogical('SnTSn')
 
     M = np.linalg.cholesky(Q11)
     MinvQ21T = scipy.linalg.solve_triangular(M, Q21.T, lower=True)
     QoverQ11 = Q22 - Q21 @ scipy.linalg.solve_triangular(M.T, MinvQ21T)
     J = np.linalg.cholesky(-QoverQ11)
 
-    # Triangular factorization Q = Qfactor1 @ Qfactor2
-    Qfactor1 = np.block([[M, np.zeros((mUpd, mUpd))], [MinvQ21T.T, -J]])
-    Qfactor2 = np.block([[M.T, MinvQ21T], [np.zeros((mUpd, mUpd)), J.T]])
-
-    ATg = np.block([data.Yn[:, :mUpd].T @ g, data.Sn[:, :mUpd].T @ g])
-    p = scipy.linalg.solve_triangular(Qfactor2, scipy.linalg.solve_triangular(Qfactor1, ATg, lower=True))
-    Ap = data.Yn[:, :mUpd] @ p[:mUpd] + data.Sn[:, :mUpd] @ p[mUpd:]
-    d = 1/gammah * Ap - 1/gammah * g
+    # Solve with the triangular factorization Q = Qfactor1 @ Qfactor2, where
+    # Qfactor1 = [[M, 0], [MinvQ21T.T, -J]] and Qfactor2 = Qfactor1.T with J negated
+    z1 = scipy.linalg.solve_triangular(M, data.cachedProject('Yn', g), lower=True)
+    z2 = scipy.linalg.solve_triangular(J, MinvQ21T.T @ z1 - data.cachedProject('Sn', g), lower=True)
+    p2 = scipy.linalg.solve_triangular(J.T, z2)
+    p1 = scipy.linalg.solve_triangular(M.T, z1 - MinvQ21T @ p2)
+    ws = data.workspace
+    d = data.combine(data.Yn, p1, ws('d'))
+    d += data.combine(data.Sn, p2, ws('tmp'))
+    d *= 1/gammah
+    d -= np.multiply(g, 1/gammah, out=ws('tmp'))
 
     return d
+
+
+def cachedData(data):
+    """Return the memory-dependent parts of Q, cached until the next update of data."""
+    cache = data.cache
+    if 'SnTYnU' not in cache:
+        SnTYn = data.cachedLogical('SnTYn')
+        cache['DnTDn'] = data.cachedLogical('sty') / data.cachedLogical('yty')
+        cache['SnTYnU'] = np.triu(SnTYn)
+        cache['SnTYnL'] = np.tril(SnTYn, -1)
+    return cache
+
+
+def updateBatchLmData(data, mask, Sn, Yn):
+    """Update batched L-BFGS data of the instances in mask."""
+    sty = np.sum(Sn * Yn, axis=1)
+    mask = mask & (sty >= parameters.crvThreshold * np.sum(Sn * Sn, axis=1))
+    # Compute new gamma
+    gamma = np.sum(Yn * Yn, axis=1) / np.where(mask, sty, 1)
+    # Perform update
+    data.update(mask, Sn, Yn, gamma)
+
+
+def inverseLBFGSBatch(data, mu, G, rows):
+    """
+    Compute regularized L-BFGS steps for the instances rows of BatchLmData.
+    The normalized quantities are obtained by scaling the product matrices,
+    and unused memory slots are padded such that their coefficients vanish.
+    """
+    i = np.arange(data.m)
+    unused = ~data.valid(rows)
+    gamma = data.gamma[rows]
+    gammah = gamma + mu
+    STS, STY, YTY = data.logical(data.STS, rows), data.logical(data.STY, rows), data.logical(data.YTY, rows)
+    ns = np.where(unused, 1, np.sqrt(STS[:, i, i]))
+    ny = np.where(unused, 1, np.sqrt(YTY[:, i, i]))
+    SnTYn = STY / (ns[:, :, None] * ny[:, None, :])
+    DnTDn = np.where(unused, 1, STY[:, i, i] / ny**2)
+
+    ratio = (mu / gamma)[:, None, None]
+    Q11 = YTY / (ny[:, :, None] * ny[:, None, :])
+    Q11[:, i, i] += gammah[:, None] * DnTDn
+    Q21 = np.triu(SnTYn) - ratio * np.tril(SnTYn, -1)
+    Q22 = -ratio * STS / (ns[:, :, None] * ns[:, None, :])
+    Q22[:, i, i] = np.where(unused, -1, Q22[:, i, i])
+
+    M = np.linalg.cholesky(Q11)
+    MT = np.swapaxes(M, 1, 2)
+    MinvQ21T = np.linalg.solve(M, np.swapaxes(Q21, 1, 2))
+    QoverQ11 = Q22 - Q21 @ np.linalg.solve(MT, MinvQ21T)
+    J = np.linalg.cholesky(-QoverQ11)
+
+    # Block triangular solves as in inverseLBFGS
+    YnTg = data.projectLogical(data.Y, G, rows) / ny
+    SnTg = data.projectLogical(data.S, G, rows) / ns
+    z1 = np.linalg.solve(M, YnTg[..., None])
+    z2 = np.linalg.solve(J, np.swapaxes(MinvQ21T, 1, 2) @ z1 - SnTg[..., None])
+    p2 = np.linalg.solve(np.swapaxes(J, 1, 2), z2)
+    p1 = np.linalg.solve(MT, z1 - MinvQ21T @ p2)
+    Ap = data.combine(data.Y, p1[..., 0] / ny, rows) + data.combine(data.S, p2[..., 0] / ns, rows)
+    D = (Ap - G) / gammah[:, None]
+
+    return D
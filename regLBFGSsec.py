@@ -2,17 +2,42 @@
 
 """
 import numpy as np
-from utility import regularization, parameters, limitedMemory
+from utility import regularization, parameters, limitedMemory, nonmonotone
 
 
-def solve(f, Df, x):
-    lmData = limitedMemory.LmData(x.shape[0], parameters.memory)
-    return regularization.genericMonotone(lmData, updateLmData, calculateStep, f, Df, x)
+# Dimension from which the steps are computed with the compact representation.
+# It needs the Gram matrices of the pairs, i.e., four products with the memory
+# per update, but only two per step instead of the six of the shifted two-loop
+# recursion, which only pays off for large n.
+compactDimension = 50000
 
 
-def solveNonmonotone(f, Df, x):
-    lmData = limitedMemory.LmData(x.shape[0], parameters.memory)
-    return regularization.genericNonmonotone(lmData, updateLmData, calculateStep, f, Df, x)
+def solve(oracle, x, tracer=None):
+    lmData, calculateStep = setup(x.shape[0])
+    return regularization.genericMonotone(lmData, updateLmData, calculateStep, oracle, x, tracer)
+
+
+def solveNonmonotone(oracle, x, history=None, tracer=None):
+    lmData, calculateStep = setup(x.shape[0])
+    return regularization.genericNonmonotone(lmData, updateLmData, calculateStep, oracle, x, history, tracer)
+
+
+def solveBatch(F, X):
+    lmData = limitedMemory.BatchLmData(X.shape[0], X.shape[1], parameters.memory)
+    return regularization.genericBatch(lmData, updateBatchLmData, calculateStepBatch, F, X)
+
+
+def solveBatchNonmonotone(F, X, histories=None):
+    lmData = limitedMemory.BatchLmData(X.shape[0], X.shape[1], parameters.memory)
+    if histories is None:
+        histories = [nonmonotone.default() for _ in range(X.shape[0])]
+    return regularization.genericBatch(lmData, updateBatchLmData, calculateStepBatch, F, X, histories)
+
+def setup(n):
+    """Limited-memory data and step calculator for dimension n."""
+    if n >= compactDimension:
+        return limitedMemory.ExtendedLmData(n, parameters.memory), calculateStepCompact
+    return limitedMemory.LmData(n, parameters.memory), calculateStep
 
 # .............
 
@@ -24,13 +49,28 @@ def updateLmData(data, sn, yn):
         # Perform update
         data.update(sn, yn, gamma)
 
+def updateBatchLmData(data, mask, Sn, Yn):
+    sty = np.sum(Sn * Yn, axis=1)
+    mask = mask & (sty >= parameters.crvThreshold * np.sum(Sn * Sn, axis=1))
+    # Compute new gamma
+    gamma = np.sum(Yn * Yn, axis=1) / np.where(mask, sty, 1)
+    # Perform update
+    data.update(mask, Sn, Yn, gamma)
+
 # .............
 
 # data is LM data, mu regularization
 def calculateStep(data, mu, g):
-    return limitedMemory.twoLoopRecursion(data.S, \
-        data.Y + mu * data.S,
-        data.sty + mu * data.sts,
-        data.mUpd,
-        data.gamma + mu,
-        -g)
+    d = np.negative(g, out=data.workspace('d'))
+    return limitedMemory.shiftedTwoLoopRecursion(data.S, data.Y, data.sts, data.sty, data.order(),
+        data.gamma, mu, d, d, data.workspace('tmp'))
+
+
+# data is extended LM data, mu regularization
+def calculateStepCompact(data, mu, g):
+    d = limitedMemory.compactInverse(data, mu, g, data.workspace('d'))
+    return np.negative(d, out=d)
+
+
+def calculateStepBatch(data, mu, G, rows):
+    return -limitedMemory.compactInverseBatch(data, mu, G, rows)
@@ -2,19 +2,24 @@
 Monotone and nonmonotone regularized L-PSB methods.
 """
 import numpy as np
+import scipy.linalg
 from utility import regularization, parameters, limitedMemory
 
 
-def solve(f, Df, x):
+# Largest condition number of [S Y]^T [S Y] for the spectral solve
+maxCondition = 1e8
+
+
+def solve(oracle, x, tracer=None):
     """Monotone regularized L-PSB method."""
     lmData = limitedMemory.ExtendedLmData(x.shape[0], parameters.memory)
-    return regularization.genericMonotone(lmData, updateLmData, inverseLPSB, f, Df, x)
+    return regularization.genericMonotone(lmData, updateLmData, inverseLPSB, oracle, x, tracer)
 
 
-def solveNonmonotone(f, Df, x):
+def solveNonmonotone(oracle, x, history=None, tracer=None):
     """Nonmonotone regularized L-PSB method."""
     lmData = limitedMemory.ExtendedLmData(x.shape[0], parameters.memory)
-    return regularization.genericNonmonotone(lmData, updateLmData, inverseLPSB, f, Df, x)
+    return regularization.genericNonmonotone(lmData, updateLmData, inverseLPSB, oracle, x, history, tracer)
 
 
 def updateLmData(data, sn, yn):
@@ -31,26 +36,53 @@ def updateLmData(data, sn, yn):
 def inverseLPSB(data, mu, g):
     """Compute regularized L-PSB step."""
     mUpd = data.mUpd
-    gamma = data.gamma
     gammah = data.gamma + mu
+    cache = cachedData(data)
 
-    Q22 = np.tril(data.STY[:mUpd, :mUpd], -1) + np.tril(data.STY[:mUpd, :mUpd], -1).T + \
-        np.diag(np.diag(data.STY[:mUpd, :mUpd])) + \
-        gamma * np.diag(np.diag(data.STS[:mUpd, :mUpd]))
-
-    Q = np.block([
-        [np.zeros((mUpd, mUpd)), np.triu(data.STS[:mUpd, :mUpd])],
-        [np.triu(data.STS[:mUpd, :mUpd]).T, Q22]
-    ])
-
-    Q += 1/gammah * np.block([
-        [data.STS[:mUpd, :mUpd], data.STY[:mUpd, :mUpd]],
-        [data.STY[:mUpd, :mUpd].T, data.YTY[:mUpd, :mUpd]]
-    ])
-
-    ATg = np.block([data.S[:, :mUpd].T @ g, data.Y[:, :mUpd].T @ g])
-    p = np.linalg.solve(Q, ATg)
-    #p = scipy.linalg.solve(Q, ATg, assume_a='sym')
-    Ap = data.S[:, :mUpd] @ p[:mUpd] + data.Y[:, :mUpd] @ p[mUpd:]
-    d = 1/gammah**2 * Ap - 1/gammah * g
+    ATg = np.concatenate([data.cachedProject('S', g), data.cachedProject('Y', g)])
+    if cache['W'] is not None:
+        # Q = W^-T (diag(lam) + 1/gammah I) W^-1
+        W = cache['W']
+        p = W @ ((W.T @ ATg) / (cache['lam'] + 1/gammah))
+    else:
+        p = np.linalg.solve(cache['Q0'] + 1/gammah * cache['G'], ATg)
+    ws = data.workspace
+    d = data.combine(data.S, p[:mUpd], ws('d'))
+    d += data.combine(data.Y, p[mUpd:], ws('tmp'))
+    d *= 1/gammah**2
+    d -= np.multiply(g, 1/gammah, out=ws('tmp'))
     return d
+
+
+def cachedData(data):
+    """
+    Return the mu-independent parts Q0 and G of Q = Q0 + 1/gammah * G and,
+    if G is well conditioned, the generalized eigendecomposition
+    Q0 W = G W diag(lam) with W^T G W = I, cached until the next update of data.
+    """
+    cache = data.cache
+    if 'Q0' not in cache:
+        mUpd = data.mUpd
+        gamma = data.gamma
+        STS, STY, YTY = data.cachedLogical('STS'), data.cachedLogical('STY'), data.cachedLogical('YTY')
+
+        Q22 = np.tril(STY, -1) + np.tril(STY, -1).T + \
+            np.diag(np.diag(STY)) + \
+            gamma * np.diag(np.diag(STS))
+        cache['Q0'] = np.block([
+            [np.zeros((mUpd, mUpd)), np.triu(STS)],
+            [np.triu(STS).T, Q22]
+        ])
+        cache['G'] = np.block([
+            [STS, STY],
+            [STY.T, YTY]
+        ])
+
+        cache['lam'] = cache['W'] = None
+        eigG = np.linalg.eigvalsh(cache['G'])
+        if eigG[0] > maxCondition**-1 * eigG[-1]:
+            try:
+                cache['lam'], cache['W'] = scipy.linalg.eigh(cache['Q0'], cache['G'])
+            except np.linalg.LinAlgError:
+                pass
+    return cache
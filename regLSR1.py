@@ -2,18 +2,23 @@
 Monotone and nonmonotone regularized L-SR1 methods.
 """
 import numpy as np
+import scipy.linalg
 from utility import regularization, parameters, limitedMemory
 
 
-def solve(f, Df, x):
+# Smallest pivot kept by the adaptive LDL^T decomposition
+pivotThreshold = 1e-6
+
+
+def solve(oracle, x, tracer=None):
     """Monotone regularized L-SR1 method."""
     lmData = limitedMemory.ExtendedLmData(x.shape[0], parameters.memory)
-    return regularization.genericMonotone(lmData, updateLmData, inverseLSR1, f, Df, x)
+    return regularization.genericMonotone(lmData, updateLmData, inverseLSR1, oracle, x, tracer)
 
-def solveNonmonotone(f, Df, x):
+def solveNonmonotone(oracle, x, history=None, tracer=None):
     """Nonmonotone regularized L-SR1 method."""
     lmData = limitedMemory.ExtendedLmData(x.shape[0], parameters.memory)
-    return regularization.genericNonmonotone(lmData, updateLmData, inverseLSR1, f, Df, x)
+    return regularization.genericNonmonotone(lmData, updateLmData, inverseLSR1, oracle, x, history, tracer)
 
 
 def updateLmData(data, sn, yn):
@@ -29,34 +34,71 @@ def updateLmData(data, sn, yn):
 
 def inverseLSR1(data, mu, g):
     """Compute regularized L-SR1 step."""
-    mUpd = data.mUpd
     gamma = data.gamma
     gammah = data.gamma + mu
+    cache = cachedData(data)
 
-    A = data.Y[:, :mUpd] - gamma * data.S[:, :mUpd]
-    Q = np.diag(np.diag(data.STY[:mUpd, :mUpd])) - gamma * data.STS[:mUpd, :mUpd] + \
-        np.tril(data.STY[:mUpd, :mUpd], -1) + np.tril(data.STY[:mUpd, :mUpd], -1).T
-    Q += 1/gammah * (data.YTY[:mUpd, :mUpd] + gamma**2*data.STS[:mUpd, :mUpd] -
-        gamma * data.STY[:mUpd, :mUpd] - gamma * data.STY[:mUpd, :mUpd].T)
-    
-    [L, U, piv] = adaptiveLU(Q)
-    ATg = A[:, piv].T @ g
-    p = np.linalg.solve(U, np.linalg.solve(L, ATg))
-    #p = scipy.linalg.solve_triangular(U, scipy.linalg.solve_triangular(L, ATg, lower=True))
-    Ap = A[:, piv] @ p
-    d = 1 / gammah**2 * Ap - 1 / gammah * g
+    # Q = Q0 + 1/gammah * A^T A with A = Y - gamma*S
+    ATg = data.cachedProject('Y', g) - gamma * data.cachedProject('S', g)
+    pFull = adaptiveSolve(cache['Q0'] + 1/gammah * cache['ATA'], ATg)
+    ws = data.workspace
+    d = data.combine(data.Y, pFull, ws('d'))
+    tmp = data.combine(data.S, pFull, ws('tmp'))
+    tmp *= gamma
+    d -= tmp
+    d *= 1 / gammah**2
+    d -= np.multiply(g, 1 / gammah, out=tmp)
     return d
 
 
-def adaptiveLU(A):
-    """Adaptive LU decomposition where rows/columns corresponding to zero pivots are discarded."""
+def cachedData(data):
+    """Return the mu-independent parts Q0 and ATA of Q = Q0 + 1/gammah * ATA, cached until the next update of data."""
+    cache = data.cache
+    if 'Q0' not in cache:
+        gamma = data.gamma
+        STS, STY, YTY = data.cachedLogical('STS'), data.cachedLogical('STY'), data.cachedLogical('YTY')
+        cache['Q0'] = np.diag(np.diag(STY)) - gamma * STS + np.tril(STY, -1) + np.tril(STY, -1).T
+        cache['ATA'] = YTY + gamma**2*STS - gamma * STY - gamma * STY.T
+    return cache
+
+
+def adaptiveSolve(A, b):
+    """Solve A p = b with the adaptive LDL^T decomposition of A (p is zero on the discarded rows)."""
+    L, D, piv = adaptiveLDL(A)
+    p = np.zeros(b.shape[0])
+    if D.size > 0:
+        z = scipy.linalg.solve_triangular(L, b[piv], lower=True, unit_diagonal=True)
+        p[piv] = scipy.linalg.solve_triangular(L.T, z / D, unit_diagonal=True)
+    return p
+
+
+def adaptiveLDL(A):
+    """
+    Adaptive LDL^T decomposition of the symmetric matrix A where rows/columns
+    corresponding to zero pivots are discarded. The rows are added one by one
+    in order: the pivot of row j is its Schur complement with respect to the
+    kept rows before it, computed with a triangular solve with the factor so
+    far, and row j is kept (extending the factor by one row) if its absolute
+    value is at least pivotThreshold.
+    """
     m = A.shape[0]
+    L = np.eye(m)
+    D = np.empty(m)
+    kept = np.empty(m, dtype=int)
+    k = 0
+    for j in range(m):
+        if k > 0:
+            w, _ = scipy.linalg.lapack.dtrtrs(L[:k, :k], A[kept[:k], j], lower=1, unitdiag=1)
+            l = w / D[:k]
+            pivot = A[j, j] - np.dot(l, w)
+        else:
+            l, pivot = L[0, :0], A[j, j]
+        if (abs(pivot) >= pivotThreshold):
+            L[k, :k] = l
+            D[k] = pivot
+            kept[k] = j
+            k += 1
+
     piv = np.full(m, False)
-    for i in range(m):
-        if (abs(A[i, i]) >= 1e-6):
-            piv[i] = True
-            A[i+1:, i] /= A[i, i]
-            A[i+1:, i+1:] -= np.outer(A[i+1:, i], A[i, i+1:])
-    
-    L = np.tril(A[np.ix_(piv, piv)], -1) + np.eye(np.sum(piv))
-    return L, np.triu(A[np.ix_(piv, piv)]), piv
+    piv[kept[:k]] = True
+    return L[:k, :k], D[:k], piv
@@ -0,0 +1,28 @@
+"""
+Agent solving the cells served by `python testAllAndSave.py --serve HOST:PORT`.
+
+The agent uses the algorithms, settings and processes x BLAS-threads layout
+of testAllAndSave.py, so the repository on its machine must be the same as
+the coordinator's, and the problems must be built there (prepareProblems.py)
+unless the built-in problems are used.
+Several agents can run on one machine. The coordinator and the agents
+authenticate with the shared secret in the environment variable
+BENCHMARK_AUTHKEY.
+
+Usage: python runAgent.py HOST:PORT [--processes N]
+"""
+import argparse
+import testAllAndSave as runner
+from utility import cluster, scheduler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('address', metavar='HOST:PORT', help="address of the coordinator")
+    parser.add_argument('--processes', type=int, default=runner.nProcesses,
+        help="number of worker processes (default: from the layout of testAllAndSave.py)")
+    args = parser.parse_args()
+
+    local = scheduler.Scheduler(runner.loadProblem, runner.solveTask, args.processes, timeout=runner.timeout)
+    failed = cluster.agent(cluster.parseAddress(args.address), runner.hello, local)
+    print(f"Coordinator done ({len(failed)} failed cells here)")
@@ -1,10 +1,74 @@
 """
+Solve all problems with all algorithms and modes and store the results.
 
+By default, the cells are solved by local worker processes. With --serve,
+the cells are served to agents (runAgent.py) on any number of machines,
+and their results are collected here (see utility/cluster.py).
+
+With problemSource = 'builtin', the NumPy implementations of a subset of
+the problems (utility/builtinProblems.py) are solved instead of the CUTEst
+problems, which need no build step; their results are kept apart for
+every dimension in results/builtin/n<builtinDimension> (e.g.,
+printReport.py --store results/builtin/n10000/store).
+
+Usage: python testAllAndSave.py [--serve HOST:PORT] [--skip-failed]
 """
-import pycutest
-import numpy as np
-import multiprocessing
+import argparse
+import functools
+import os
+import sys
 import time
+from utility import threads, problems as problemCache
+from utility.problems import problemsToRun
+
+# Problems: 'pycutest' (built by prepareProblems.py) or 'builtin' (NumPy
+# implementations of dimension builtinDimension, rounded down if needed)
+problemSource = 'pycutest'
+builtinDimension = 10000
+
+# List of problems to solve
+problems = problemsToRun()
+
+if problemSource == 'pycutest':
+    # Only load problems which were built by prepareProblems.py
+    missing = problemCache.missingProblems(problems)
+    if missing:
+        sys.exit(f"Problems not built (run prepareProblems.py first): {', '.join(missing)}")
+    manifest = problemCache.loadManifest()
+    dimensions = {problem: manifest[problem]['n'] for problem in problems}
+    outputDirectory = "results"
+else:
+    # The built-in problems import NumPy, so the BLAS threads of this process
+    # are limited through threadpoolctl below
+    from utility import builtinProblems
+    skipped = [problem for problem in problems if problem not in builtinProblems.definitions]
+    if skipped:
+        print(f"Skipping problems without a built-in version: {', '.join(skipped)}")
+    problems = [problem for problem in problems if problem in builtinProblems.definitions]
+    importProblem = functools.partial(builtinProblems.import_problem, n=builtinDimension)
+    manifest = {problem: {'n': importProblem(problem).n} for problem in problems}
+    dimensions = {problem: manifest[problem]['n'] for problem in problems}
+    # The checkpoint keys do not include the dimension, so every dimension
+    # has its own log and store
+    outputDirectory = os.path.join("results", "builtin", f"n{builtinDimension}")
+
+# Worker processes and BLAS threads per process for every size class of the
+# problems (None chooses them from the dimensions and the number of cores;
+# fixing either gives one layout for all problems), planned for the problems
+# which are solved. The limit for the largest class must be set before NumPy
+# is imported (except for the built-in problems); agents use that layout.
+layouts = threads.plan(dimensions, processes=None, threads=None)
+nProcesses, blasThreads = layouts[0][:2]
+threads.limit(blasThreads)
+for processes, blas, classProblems in layouts:
+    print(f"Using {processes} processes x {blas} BLAS threads for {len(classProblems)} problems")
+
+import numpy as np
+from utility import scheduler, oracle, results, checkpoint, cluster
+if problemSource == 'pycutest':
+    problemCache.useCache()
+    import pycutest
+    importProblem = pycutest.import_problem
 
 # Algorithms
 import regLSR1
@@ -15,76 +79,73 @@ import armijoLBFGS
 import wolfeLBFGS
 
 
-def problemsToRun():
-    """..."""
-    # General list of eligible problems
-    problems = 'ARWHEAD', 'BA-L16LS', 'BA-L21LS', 'BA-L49LS', 'BA-L52LS', \
-        'BA-L73LS', 'BDQRTIC', 'BOX', 'BOXPOWER', 'BROYDN3DLS', 'BROYDN7D', \
-        'BROYDNBDLS', 'BRYBND', 'CHAINWOO', 'COSINE', 'CRAGGLVY', 'CURLY10', \
-        'CURLY20', 'CURLY30', 'DIXMAANA', 'DIXMAANB', 'DIXMAANC', 'DIXMAAND', \
-        'DIXMAANE', 'DIXMAANF', 'DIXMAANG', 'DIXMAANH', 'DIXMAANI', 'DIXMAANJ', \
-        'DIXMAANK', 'DIXMAANL', 'DIXMAANM', 'DIXMAANN', 'DIXMAANO', 'DIXMAANP', \
-        'DIXON3DQ', 'DQDRTIC', 'DQRTIC', 'EDENSCH', 'EG2', 'EIGENALS', 'EIGENBLS', \
-        'EIGENCLS', 'ENGVAL1', 'EXTROSNB', 'FLETBV3M', 'FLETCBV2', 'FLETCBV3', \
-        'FLETCHBV', 'FLETCHCR', 'FMINSRF2', 'FMINSURF', 'FREUROTH', 'GENHUMPS', \
-        'INDEF', 'INDEFM', 'JIMACK', 'LIARWHD', 'MODBEALE', 'MOREBV', 'MSQRTALS', \
-        'MSQRTBLS', 'NCB20', 'NCB20B', 'NONCVXU2', 'NONCVXUN', 'NONDIA', 'NONDQUAR', \
-        'NONMSQRT', 'OSCIGRAD', 'PENALTY1', 'POWELLSG', 'POWER', 'QUARTC', 'SBRYBND', \
-        'SCHMVETT', 'SCOSINE', 'SCURLY10', 'SCURLY20', 'SCURLY30', 'SINQUAD', \
-        'SPARSINE', 'SPARSQUR', 'SPMSRTLS', 'SROSENBR', 'SSBRYBND', 'SSCOSINE', \
-        'TESTQUAD', 'TOINTGSS', 'TQUARTIC', 'TRIDIA', 'WOODS', 'YATP1LS', 'YATP2LS'
-
-    # Fast problems
-    #problems = 'ARWHEAD', 'BDQRTIC', 'BOXPOWER', 'BROYDN3DLS', 'BROYDNBDLS', \
-    #    'BRYBND', 'COSINE', 'CRAGGLVY', 'DIXMAANA', 'DIXMAANB', 'DIXMAANC', \
-    #    'DIXMAAND','DIXMAANE','DIXMAANF','DIXMAANG','DIXMAANH', 'DIXMAANI', \
-    #    'DIXMAANJ','DIXMAANK','DIXMAANL','DIXMAANM','DIXMAANN', 'DIXMAANO', \
-    #    'DIXMAANP','DIXON3DQ','DQDRTIC','DQRTIC','EDENSCH', 'EG2', 'ENGVAL1', \
-    #    'FLETBV3M','FLETCBV2','FMINSRF2','FMINSURF', 'FREUROTH','LIARWHD', \
-    #    'MOREBV','NONDIA','NONDQUAR', 'PENALTY1','POWELLSG','QUARTC','SCHMVETT', \
-    #    'SINQUAD', 'SPARSQUR','SROSENBR','TOINTGSS','TQUARTIC', 'WOODS'
-
-    # List of problems that can be excluded because either:
-    #  * the initial point is already stationary (FLETCBV2)
-    #  * all algorithms are known to fail (the rest)
-    exclude = 'BA-L16LS', 'BA-L21LS', 'BA-L49LS', 'BA-L52LS', 'BA-L73LS', \
-        'CURLY30', 'FLETCBV2', 'FLETCBV3', 'FLETCHBV', 'INDEF', 'NONMSQRT', \
-        'SBRYBND', 'SCOSINE', 'SCURLY10', 'SCURLY20', 'SCURLY30', 'SSCOSINE'
-
-    # Use list comprehension to maintain order
-    return [p for p in problems if p not in exclude]
-
-
-def sharedArray(dtype, dims):
-    """Create a shared numpy array."""
-    mpArray = multiprocessing.Array(dtype, int(np.prod(dims)), lock=False)
-    return np.frombuffer(mpArray, dtype=dtype).reshape(dims)
-
-
-# It would be nice if we could parallelise on a more granular level
-# (e.g., for every combination of problem, algorithm and mode) but
-# sadly pycutest modules are not pickle-able, and importing a problem
-# seems to be quite costly (might require a linking step).
-def solveProblem(pId, problem):
+def loadProblem(problem):
+    """
+    Import a prebuilt or built-in problem (called inside the worker processes) together
+    with the evaluation cache shared by all runs on it in this worker.
+    """
+    print(f"Importing problem: {problem}")
+    return importProblem(problem), oracle.EvaluationCache(cacheSize)
+
+
+def loadProblemLimited(blas, problem):
+    """loadProblem in a worker whose BLAS threads are limited to blas."""
+    threads.limit(blas)
+    return loadProblem(problem)
+
+
+def solveTask(loaded, task):
     """
-    Solve a named problem with all algorithms/modes and write the
-    results into fx, opt, iter, and nf.
+    Solve a problem with one algorithm/mode (repeats times) and return the
+    problem dimension, nf, iter, fx, opt, and the median wall-clock, CPU,
+    oracle and overhead (wall-clock minus oracle) times and the spread
+    (max - min) of the wall-clock times.
     """
-    print(f"Starting problem: {problem}")
-    pycutestProb = pycutest.import_problem(problem)
-    def f(x): return pycutestProb.obj(x)
-    def Df(x): return pycutestProb.lagjac(x)[0]
-    for a, algorithm in enumerate(algorithms):
-        for m, mode in enumerate(modes):
-            # Solve problem with current algorithm and mode
-            x, it = getattr(algorithm, mode)(f, Df, pycutestProb.x0)
-            fx[m, a, pId] = f(x)
-            #opt[m, a, pId] = np.linalg.norm(Df(x)) / max(1, np.linalg.norm(x))
-            opt[m, a, pId] = np.linalg.norm(Df(x), np.inf)
-            iter[m, a, pId], nf[m, a, pId] = it
-    
+    problem, a, m = task
+    pycutestProb, cache = loaded
+    times = []
+    for _ in range(repeats):
+        prob = oracle.fromPycutest(pycutestProb, cache if cacheSize > 0 else None, timed=True,
+            fusedTrial=fusedTrial)
+        tic, cpuTic = time.perf_counter(), time.process_time()
+        x, (it, nf) = getattr(algorithms[a], modes[m])(prob, pycutestProb.x0)
+        times.append((time.perf_counter() - tic, time.process_time() - cpuTic, prob.time))
+    wall, cpu, oracleTime = np.array(times).T
+    fxFinal, gxFinal = prob.valueAndGradient(x)
+    #opt = np.linalg.norm(gxFinal) / max(1, np.linalg.norm(x))
+    opt = np.linalg.norm(gxFinal, np.inf)
+
     # To show where we are
-    print(f"Completed problem: {problem}")
+    print(f"Completed {algorithms[a].__name__}.{modes[m]} on {problem} "
+          f"(cache hits/misses: {cache.hits}/{cache.misses})")
+    return {'n': int(pycutestProb.n), 'nf': int(nf), 'iter': int(it), 'fx': float(fxFinal),
+        'opt': float(opt), 'time': np.median(wall), 'timeSpread': np.ptp(wall),
+        'cpuTime': np.median(cpu), 'oracleTime': np.median(oracleTime),
+        'overheadTime': np.median(wall - oracleTime)}
+
+
+def saveTask(task, result, error):
+    """Append a completed cell to the log; failed cells get nf = inf and a reason."""
+    problem, a, m = task
+    if error is not None:
+        result = {'n': manifest[problem]['n'], 'nf': np.inf, 'iter': -1, 'fx': np.nan, 'opt': np.nan,
+            'time': timeout if error.startswith('Timeout') else np.nan,
+            'reason': error.strip().splitlines()[-1], 'error': error}
+    log.append({'fingerprint': fingerprints[a], 'mode': modes[m],
+        'algorithm': algorithms[a].__name__, 'problem': problem, **result})
+
+
+def unstored(record, stored):
+    """Whether a logged cell is missing in the store or replaces a failure stored there."""
+    key = checkpoint.Log.key(record)
+    return key not in stored or (stored[key] and 'reason' not in record)
+
+
+def expectedRuntime(task):
+    """Sort key for longest-first ordering of the tasks."""
+    problem, a, m = task
+    runtime = runtimes.get((modes[m], algorithms[a].__name__, problem))
+    return (0, -manifest[problem]['n']) if runtime is None else (1, -runtime)
 
 
 # Specify algorithms to run
@@ -93,27 +154,96 @@ algorithms = regLBFGS, armijoLBFGS, wolfeLBFGS, regLBFGSsec, regLSR1, regLPSB
 # Specify modes to run
 modes = 'solve', 'solveNonmonotone'
 
-# List of problems to solve
-problems = problemsToRun()
-
-# Initialize output data
-nModes, nAlgs, nProbs = len(modes), len(algorithms), len(problems)
-fx = sharedArray('d', (nModes, nAlgs, nProbs))
-opt = sharedArray('d', (nModes, nAlgs, nProbs))
-iter = sharedArray('I', (nModes, nAlgs, nProbs))
-nf = sharedArray('I', (nModes, nAlgs, nProbs))
-
-# Solve all problems
-tic = time.perf_counter()
-pool = multiprocessing.Pool()
-pool.starmap(solveProblem, enumerate(problems))
-#for p, problem in enumerate(problems):
-#    solveProblem(p, problem)
-toc = time.perf_counter()
-print(f"Total time: {toc - tic:0.4f} seconds")
-
-# Save results to files
-for i, m in enumerate(modes):
-    for j, a in enumerate(algorithms):
-        data = np.vstack([nf[i, j, :], iter[i, j, :], fx[i, j, :], opt[i, j, :]]).T
-        np.savetxt(f"results/{a.__name__}_{m}.csv", data, header="nf, iter, fx, opt", fmt="%i, %i, %.5e, %.5e")
+# Wall-clock limit per cell in seconds (None disables)
+timeout = 3600
+
+# Number of timed runs per cell (the median and spread are reported)
+repeats = 3
+
+# Number of oracle evaluations memoized per problem and worker (0 disables).
+# This does not change the reported evaluation counts, but cache hits make
+# the oracle times meaningless, so only enable it if timings are not needed.
+cacheSize = 0
+
+# Evaluate the trial points of the regularization methods with the fused
+# value and gradient (see utility/oracle.py). This saves the second oracle
+# call at accepted points but wastes a gradient at rejected ones, so it only
+# pays off when the gradient costs little on top of the value.
+fusedTrial = False
+
+# Seconds after which a cell served to an agent is handed out again
+leaseTime = None if timeout is None else timeout + 600
+
+# Keys of the logged cells
+fingerprints = [checkpoint.fingerprint(a) for a in algorithms]
+
+# Agents must have the same algorithms, parameters and problems
+hello = fingerprints, problemSource, builtinDimension
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--serve', metavar='HOST:PORT', help="serve the cells to agents (runAgent.py)")
+    parser.add_argument('--skip-failed', action='store_true',
+        help="do not retry cells which failed in an earlier invocation")
+    args = parser.parse_args()
+
+    # Completed cells are logged immediately; a restart skips the cells which
+    # were completed with the current source and parameters of the algorithm.
+    # Failed cells (timeouts, exceptions, dead workers) are solved again
+    # unless --skip-failed is given.
+    os.makedirs(outputDirectory, exist_ok=True)
+    log = checkpoint.Log(os.path.join(outputDirectory, "checkpoint.jsonl"))
+
+    # Solve all problems, one task per (problem, algorithm, mode)
+    cells = [(problem, a, m) for problem in problems
+        for a in range(len(algorithms)) for m in range(len(modes))]
+    def completed(problem, a, m):
+        record = log.get(fingerprints[a], modes[m], algorithms[a].__name__, problem)
+        return record is not None and (args.skip_failed or 'reason' not in record)
+    tasks = [cell for cell in cells if not completed(*cell)]
+    print(f"Skipping {len(cells) - len(tasks)} completed cells")
+
+    # Longest first: cells without a logged runtime (largest problems first),
+    # then by the logged runtime of any earlier version of the algorithm
+    runtimes = log.runtimes()
+    tasks.sort(key=expectedRuntime)
+
+    tic = time.perf_counter()
+    if args.serve is None:
+        # One scheduler per size class, the class with the most threads first
+        failed = []
+        for processes, blas, classProblems in layouts:
+            members = set(classProblems)
+            classTasks = [task for task in tasks if task[0] in members]
+            if classTasks:
+                load = loadProblem if blas == blasThreads else functools.partial(loadProblemLimited, blas)
+                failed += scheduler.Scheduler(load, solveTask, processes, timeout=timeout).run(classTasks, saveTask)
+        layout = {'processes': nProcesses, 'blasThreads': blasThreads, 'cores': threads.cores(),
+            'classes': [{'processes': processes, 'blasThreads': blas, 'problems': len(classProblems)}
+                for processes, blas, classProblems in layouts],
+            'threadpools': threads.info()}
+    else:
+        failed = cluster.Coordinator(cluster.parseAddress(args.serve), hello, leaseTime).run(tasks, saveTask)
+        layout = {'coordinator': args.serve}
+    toc = time.perf_counter()
+    print(f"Total time: {toc - tic:0.4f} seconds ({len(failed)} failed cells)")
+
+    # Append the logged cells which are not in the store yet: the cells solved
+    # now and those of an earlier invocation which was interrupted. A stored
+    # failure is replaced by a successful retry.
+    columns = 'n', 'nf', 'iter', 'fx', 'opt', 'time', 'timeSpread', 'cpuTime', 'oracleTime', 'overheadTime'
+    store = results.load(os.path.join(outputDirectory, "store"))
+    stored = store.cells()
+    run, nStored = None, 0
+    for m in modes:
+        for a, fingerprint in zip(algorithms, fingerprints):
+            records = [log.get(fingerprint, m, a.__name__, problem) for problem in problems]
+            records = [record for record in records if record is not None and unstored(record, stored)]
+            if records:
+                if run is None:
+                    run = store.newRun(repeats=repeats, cacheSize=cacheSize, **layout)
+                store.append(run, m, a.__name__, [record['problem'] for record in records],
+                    reason=[record.get('reason') for record in records], fingerprint=fingerprint,
+                    **{column: [record.get(column, np.nan) for record in records] for column in columns})
+                nStored += len(records)
+    print(f"Stored {nStored} cells")
@@ -1,20 +1,14 @@
 import numpy as np
+from utility import results
 
 
 algorithms = ['regLBFGS', 'regLBFGSsec', 'regLSR1', 'regLPSB', 'armijoLBFGS', 'wolfeLBFGS']
 
 
-# Read data for the algorithms above
-nfM = np.array([np.loadtxt(f"results/{a}_solve.csv", delimiter=',')[:, 0] for a in algorithms])
-iterM = np.array([np.loadtxt(f"results/{a}_solve.csv", delimiter=',')[:, 1] for a in algorithms])
-nfN = np.array([np.loadtxt(f"results/{a}_solveNonmonotone.csv", delimiter=',')[:, 0] for a in algorithms])
-iterN = np.array([np.loadtxt(f"results/{a}_solveNonmonotone.csv", delimiter=',')[:, 1] for a in algorithms])
-
-
-# Load LMTR results
-lmtrResults = np.loadtxt('results/lmtr.csv', delimiter=',')
-iterM = np.vstack([iterM, lmtrResults[:, 0]])
-nfM = np.vstack([nfM, lmtrResults[:, 1]])
+# Read data for the algorithms above and the LMTR results (eigLBFGS)
+store = results.load("results/store")
+nfM, iterM = store.table('solve', algorithms + ['eigLBFGS'], 'nf', 'iter')
+nfN, iterN = store.table('solveNonmonotone', algorithms, 'nf', 'iter')
 
 
 #successM = np.sum(iterM / nfM, axis=1) / iterM.shape[1]
@@ -0,0 +1,384 @@
+"""
+NumPy implementations of a subset of the CUTEst problems of the benchmark.
+
+The problems follow the SIF definitions (objective and starting point) for
+any dimension n and evaluate the value and gradient in one vectorized
+pass, so they need neither the CUTEst toolchain nor a build step.
+`import_problem` returns an object with the interface of the pycutest
+problems used by the runner (name, n, x0, obj(x, gradient=False) and
+lagjac(x)), so it can be used with oracle.fromPycutest.
+
+Dimensions which the structure of a problem does not allow are rounded
+down (e.g., to a multiple of 3 for the DIXMAAN problems).
+
+Running this module compares the problems with pycutest (at its default
+dimensions) if it is available and checks the gradients by complex-step
+differentiation.
+"""
+import functools
+import numpy as np
+
+
+def arwhead(x, gradient):
+    xn = x[-1]
+    q = x[:-1]**2 + xn**2
+    f = np.sum(3 - 4*x[:-1]) + np.dot(q, q)
+    if not gradient:
+        return f
+    g = np.empty_like(x)
+    g[:-1] = 4*q*x[:-1] - 4
+    g[-1] = 4*xn*np.sum(q)
+    return f, g
+
+
+def bdqrtic(x, gradient):
+    l = 3 - 4*x[:-4]
+    q = x[:-4]**2 + 2*x[1:-3]**2 + 3*x[2:-2]**2 + 4*x[3:-1]**2 + 5*x[-1]**2
+    f = np.dot(l, l) + np.dot(q, q)
+    if not gradient:
+        return f
+    g = np.zeros_like(x)
+    g[:-4] += 4*q*x[:-4] - 8*l
+    g[1:-3] += 8*q*x[1:-3]
+    g[2:-2] += 12*q*x[2:-2]
+    g[3:-1] += 16*q*x[3:-1]
+    g[-1] += 20*x[-1]*np.sum(q)
+    return f, g
+
+
+def cosine(x, gradient):
+    u = x[:-1]**2 - 0.5*x[1:]
+    f = np.sum(np.cos(u))
+    if not gradient:
+        return f
+    s = np.sin(u)
+    g = np.zeros_like(x)
+    g[:-1] -= 2*x[:-1]*s
+    g[1:] += 0.5*s
+    return f, g
+
+
+def dixmaan(alpha, beta, gamma, delta, k, x, gradient):
+    n = len(x)
+    m = n // 3
+    i = np.arange(1, n + 1) / n
+    w1, w2, w3, w4 = i**k[0], i[:-1]**k[1], i[:2*m]**k[2], i[:m]**k[3]
+    a, b = x[:-1], x[1:]
+    u = b + b**2
+    f = 1 + alpha*np.sum(w1*x**2) + beta*np.sum(w2*a**2*u**2) \
+        + gamma*np.sum(w3*x[:2*m]**2*x[m:]**4) + delta*np.sum(w4*x[:m]*x[2*m:])
+    if not gradient:
+        return f
+    g = 2*alpha*w1*x
+    g[:-1] += 2*beta*w2*a*u**2
+    g[1:] += 2*beta*w2*a**2*u*(1 + 2*b)
+    g[:2*m] += 2*gamma*w3*x[:2*m]*x[m:]**4
+    g[m:] += 4*gamma*w3*x[:2*m]**2*x[m:]**3
+    g[:m] += delta*w4*x[2*m:]
+    g[2*m:] += delta*w4*x[:m]
+    return f, g
+
+
+def dixon3dq(x, gradient):
+    r = x[1:-1] - x[2:]
+    f = (x[0] - 1)**2 + np.dot(r, r) + (x[-1] - 1)**2
+    if not gradient:
+        return f
+    g = np.zeros_like(x)
+    g[0] += 2*(x[0] - 1)
+    g[1:-1] += 2*r
+    g[2:] -= 2*r
+    g[-1] += 2*(x[-1] - 1)
+    return f, g
+
+
+def dqdrtic(x, gradient):
+    f = np.dot(x[:-2], x[:-2]) + 100*np.dot(x[1:-1], x[1:-1]) + 100*np.dot(x[2:], x[2:])
+    if not gradient:
+        return f
+    g = np.zeros_like(x)
+    g[:-2] += 2*x[:-2]
+    g[1:-1] += 200*x[1:-1]
+    g[2:] += 200*x[2:]
+    return f, g
+
+
+def dqrtic(x, gradient):
+    r = x - np.arange(1, len(x) + 1)
+    r2 = r**2
+    f = np.dot(r2, r2)
+    if not gradient:
+        return f
+    return f, 4*r2*r
+
+
+def edensch(x, gradient):
+    a, b = x[:-1], x[1:]
+    r = (a - 2)*b
+    f = 16 + np.sum((a - 2)**4) + np.dot(r, r) + np.sum((b + 1)**2)
+    if not gradient:
+        return f
+    g = np.zeros_like(x)
+    g[:-1] += 4*(a - 2)**3 + 2*r*b
+    g[1:] += 2*r*(a - 2) + 2*(b + 1)
+    return f, g
+
+
+def engval1(x, gradient):
+    q = x[:-1]**2 + x[1:]**2
+    f = np.dot(q, q) + np.sum(3 - 4*x[:-1])
+    if not gradient:
+        return f
+    g = np.zeros_like(x)
+    g[:-1] += 4*q*x[:-1] - 4
+    g[1:] += 4*q*x[1:]
+    return f, g
+
+
+def freuroth(x, gradient):
+    a, b = x[:-1], x[1:]
+    r1 = a - 13 + ((5 - b)*b - 2)*b
+    r2 = a - 29 + ((1 + b)*b - 14)*b
+    f = np.dot(r1, r1) + np.dot(r2, r2)
+    if not gradient:
+        return f
+    g = np.zeros_like(x)
+    g[:-1] += 2*(r1 + r2)
+    g[1:] += 2*r1*(10*b - 3*b**2 - 2) + 2*r2*(3*b**2 + 2*b - 14)
+    return f, g
+
+
+def liarwhd(x, gradient):
+    r = x**2 - x[0]
+    f = 4*np.dot(r, r) + np.sum((x - 1)**2)
+    if not gradient:
+        return f
+    g = 16*r*x + 2*(x - 1)
+    g[0] -= 8*np.sum(r)
+    return f, g
+
+
+def nondia(x, gradient):
+    r = x[0] - x[:-1]**2
+    f = (x[0] - 1)**2 + 100*np.dot(r, r)
+    if not gradient:
+        return f
+    g = np.zeros_like(x)
+    g[:-1] -= 400*r*x[:-1]
+    g[0] += 2*(x[0] - 1) + 200*np.sum(r)
+    return f, g
+
+
+def nondquar(x, gradient):
+    r = x[:-2] + x[1:-1] + x[-1]
+    s = x[-2] + x[-1]
+    f = (x[0] - x[1])**2 + np.sum(r**4) + s**2
+    if not gradient:
+        return f
+    c = 4*r**3
+    g = np.zeros_like(x)
+    g[:-2] += c
+    g[1:-1] += c
+    g[-1] += np.sum(c)
+    g[0] += 2*(x[0] - x[1])
+    g[1] -= 2*(x[0] - x[1])
+    g[-2:] += 2*s
+    return f, g
+
+
+def powellsg(x, gradient):
+    a, b, c, d = x[0::4], x[1::4], x[2::4], x[3::4]
+    r1, r2, r3, r4 = a + 10*b, c - d, b - 2*c, a - d
+    f = np.dot(r1, r1) + 5*np.dot(r2, r2) + np.sum(r3**4) + 10*np.sum(r4**4)
+    if not gradient:
+        return f
+    g = np.empty_like(x)
+    g[0::4] = 2*r1 + 40*r4**3
+    g[1::4] = 20*r1 + 4*r3**3
+    g[2::4] = 10*r2 - 8*r3**3
+    g[3::4] = -10*r2 - 40*r4**3
+    return f, g
+
+
+def sinquad(x, gradient):
+    x1, xn = x[0], x[-1]
+    v = x[1:-1] - xn
+    r = np.sin(v) - x1**2 + x[1:-1]**2
+    e = xn**2 - x1**2
+    f = (x1 - 1)**4 + np.dot(r, r) + e**2
+    if not gradient:
+        return f
+    c = np.cos(v)
+    g = np.empty_like(x)
+    g[0] = 4*(x1 - 1)**3 - 4*x1*np.sum(r) - 4*x1*e
+    g[1:-1] = 2*r*(c + 2*x[1:-1])
+    g[-1] = -2*np.dot(r, c) + 4*xn*e
+    return f, g
+
+
+def srosenbr(x, gradient):
+    a, b = x[0::2], x[1::2]
+    r = b - a**2
+    f = 100*np.dot(r, r) + np.sum((a - 1)**2)
+    if not gradient:
+        return f
+    g = np.empty_like(x)
+    g[0::2] = -400*r*a + 2*(a - 1)
+    g[1::2] = 200*r
+    return f, g
+
+
+def tquartic(x, gradient):
+    r = x[0]**2 - x[1:]**2
+    f = (x[0] - 1)**2 + np.dot(r, r)
+    if not gradient:
+        return f
+    g = np.empty_like(x)
+    g[0] = 2*(x[0] - 1) + 4*x[0]*np.sum(r)
+    g[1:] = -4*r*x[1:]
+    return f, g
+
+
+def tridia(x, gradient):
+    w = np.arange(2, len(x) + 1)
+    r = 2*x[1:] - x[:-1]
+    f = (x[0] - 1)**2 + np.dot(w*r, r)
+    if not gradient:
+        return f
+    g = np.zeros_like(x)
+    g[0] = 2*(x[0] - 1)
+    g[1:] += 4*w*r
+    g[:-1] -= 2*w*r
+    return f, g
+
+
+def woods(x, gradient):
+    a, b, c, d = x[0::4], x[1::4], x[2::4], x[3::4]
+    r1, r2, r3 = b - a**2, d - c**2, b + d - 2
+    f = 100*np.dot(r1, r1) + np.sum((1 - a)**2) + 90*np.dot(r2, r2) + np.sum((1 - c)**2) \
+        + 10*np.dot(r3, r3) + 0.1*np.sum((b - d)**2)
+    if not gradient:
+        return f
+    g = np.empty_like(x)
+    g[0::4] = -400*r1*a - 2*(1 - a)
+    g[1::4] = 200*r1 + 20*r3 + 0.2*(b - d)
+    g[2::4] = -360*r2*c - 2*(1 - c)
+    g[3::4] = 180*r2 + 20*r3 - 0.2*(b - d)
+    return f, g
+
+
+def repeated(values):
+    """Starting point repeating values."""
+    return lambda n: np.resize(np.array(values, dtype=float), n)
+
+
+def constant(value):
+    return lambda n: np.full(n, float(value))
+
+
+def freurothStart(n):
+    x0 = np.zeros(n)
+    x0[:2] = 0.5, -2
+    return x0
+
+
+# DIXMAAN parameters alpha, beta, gamma, delta and exponents k1, ..., k4
+dixmaanParameters = {
+    'A': (1, 0, 0.125, 0.125, (0, 0, 0, 0)),
+    'B': (1, 0.0625, 0.0625, 0.0625, (0, 0, 0, 0)),
+    'C': (1, 0.125, 0.125, 0.125, (0, 0, 0, 0)),
+    'D': (1, 0.26, 0.26, 0.26, (0, 0, 0, 0)),
+    'E': (1, 0, 0.125, 0.125, (1, 0, 0, 1)),
+    'F': (1, 0.0625, 0.0625, 0.0625, (1, 0, 0, 1)),
+    'G': (1, 0.125, 0.125, 0.125, (1, 0, 0, 1)),
+    'H': (1, 0.26, 0.26, 0.26, (1, 0, 0, 1)),
+    'I': (1, 0, 0.125, 0.125, (2, 0, 0, 2)),
+    'J': (1, 0.0625, 0.0625, 0.0625, (2, 0, 0, 2)),
+    'K': (1, 0.125, 0.125, 0.125, (2, 0, 0, 2)),
+    'L': (1, 0.26, 0.26, 0.26, (2, 0, 0, 2)),
+}
+
+# Name: (function, starting point, n must be a multiple of, default n)
+definitions = {
+    'ARWHEAD': (arwhead, constant(1), 1, 5000),
+    'BDQRTIC': (bdqrtic, constant(1), 1, 5000),
+    'COSINE': (cosine, constant(1), 1, 10000),
+    'DIXON3DQ': (dixon3dq, constant(-1), 1, 10000),
+    'DQDRTIC': (dqdrtic, constant(3), 1, 5000),
+    'DQRTIC': (dqrtic, constant(2), 1, 5000),
+    'EDENSCH': (edensch, constant(0), 1, 2000),
+    'ENGVAL1': (engval1, constant(2), 1, 5000),
+    'FREUROTH': (freuroth, freurothStart, 1, 5000),
+    'LIARWHD': (liarwhd, constant(4), 1, 5000),
+    'NONDIA': (nondia, constant(-1), 1, 5000),
+    'NONDQUAR': (nondquar, repeated([1, -1]), 1, 5000),
+    'POWELLSG': (powellsg, repeated([3, -1, 0, 1]), 4, 5000),
+    'QUARTC': (dqrtic, constant(2), 1, 5000),
+    'SINQUAD': (sinquad, constant(0.1), 1, 5000),
+    'SROSENBR': (srosenbr, repeated([-1.2, 1]), 2, 5000),
+    'TQUARTIC': (tquartic, constant(0.1), 1, 5000),
+    'TRIDIA': (tridia, constant(1), 1, 5000),
+    'WOODS': (woods, repeated([-3, -1, -3, -1]), 4, 4000),
+    **{f'DIXMAAN{key}': (functools.partial(dixmaan, *values), constant(2), 3, 3000)
+        for key, values in dixmaanParameters.items()},
+}
+
+
+class Problem:
+    """Built-in problem with the interface of a pycutest problem."""
+    def __init__(self, name, n=None):
+        self.fun, start, multiple, default = definitions[name]
+        self.name = name
+        self.n = (default if n is None else n) // multiple * multiple
+        self.x0 = start(self.n)
+
+    def obj(self, x, gradient=False):
+        """Objective value, or value and gradient if gradient is True."""
+        return self.fun(x, gradient)
+
+    def lagjac(self, x):
+        """Gradient (and no constraint Jacobian)."""
+        return self.fun(x, True)[1], None
+
+
+def import_problem(name, n=None):
+    """Built-in problem name with dimension n (None for the default)."""
+    return Problem(name, n)
+
+
+def validate(name, rng):
+    """
+    Largest relative errors of the value and gradient compared to pycutest
+    (None if not available) and of the gradient compared to complex-step
+    derivatives, at x0 and a random point.
+    """
+    try:
+        import pycutest
+        reference = pycutest.import_problem(name)
+    except ImportError:
+        reference = None
+    problem = Problem(name, None if reference is None else reference.n)
+    points = [problem.x0, problem.x0 + rng.standard_normal(problem.n)]
+    errorPycutest = errorStep = 0
+    for x in points:
+        f, g = problem.obj(x, gradient=True)
+        if reference is not None:
+            fRef, gRef = reference.obj(x, gradient=True)
+            errorPycutest = max(errorPycutest, abs(f - fRef) / max(1, abs(fRef)),
+                np.linalg.norm(g - gRef, np.inf) / max(1, np.linalg.norm(gRef, np.inf)))
+            if not np.array_equal(problem.x0, reference.x0):
+                errorPycutest = np.inf
+        for i in rng.choice(problem.n, 5, replace=False):
+            xc = x.astype(complex)
+            xc[i] += 1e-20j
+            derivative = problem.obj(xc).imag / 1e-20
+            errorStep = max(errorStep, abs(derivative - g[i]) / max(1, abs(g[i])))
+    return (None if reference is None else errorPycutest), errorStep
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    for name in definitions:
+        errorPycutest, errorStep = validate(name, rng)
+        versus = "pycutest not available" if errorPycutest is None else f"vs. pycutest {errorPycutest:.1e}"
+        print(f"{name:10s} {versus}, gradient vs. complex step {errorStep:.1e}")
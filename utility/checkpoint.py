@@ -0,0 +1,107 @@
+"""
+Durable log of completed benchmark cells.
+
+Every completed (problem, algorithm, mode) cell is appended to a JSON lines
+file as soon as it is reported, and the file is synced to disk. Records
+are keyed by a fingerprint of the algorithm: a hash of the source file of
+its module and of the utility modules it uses (directly or through other
+utility modules), together with the settings of the parameters file. Only
+these .py files are read, so neither installed packages nor the modules
+of the runner and the plotting tools enter the fingerprint. A restarted
+sweep skips the cells with a record for the current fingerprint, so only
+interrupted cells and cells of changed algorithms are solved again.
+"""
+import hashlib
+import json
+import os
+import sys
+import types
+import numpy as np
+from . import parameters, results
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def utilityModules(module):
+    """
+    Names of the utility modules used by module: modules, classes and
+    functions of the utility package among its globals, recursively. The
+    parameters module is left out, its settings are hashed instead.
+    """
+    names = set()
+    def visit(module):
+        for value in vars(module).values():
+            if isinstance(value, types.ModuleType):
+                name = value.__name__
+            else:
+                name = getattr(value, '__module__', None)
+            if isinstance(name, str) and name.startswith(__package__ + '.') \
+                    and name != parameters.__name__ and name not in names:
+                names.add(name)
+                visit(sys.modules[name])
+    visit(module)
+    return sorted(names)
+
+
+def sourceFiles(module):
+    """Source file of an algorithm module followed by those of the utility modules it uses."""
+    return [os.path.abspath(module.__file__)] + [os.path.abspath(sys.modules[name].__file__)
+        for name in utilityModules(module)]
+
+
+def fingerprint(module):
+    """
+    Hash of the source of an algorithm module and the utility modules it
+    uses and of the parameter settings.
+    """
+    digest = hashlib.sha256()
+    for path in sourceFiles(module):
+        digest.update(os.path.relpath(path, root).encode())
+        with open(path, 'rb') as file:
+            digest.update(file.read())
+    digest.update(json.dumps(results.parameterSettings(), sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+class Log:
+    """Append-only log of completed cells at path (created if needed)."""
+    def __init__(self, path):
+        self.records = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Incomplete line of an interrupted append
+                    self.records[self.key(record)] = record
+        self.file = open(path, 'a')
+        if self.file.tell() > 0:
+            with open(path, 'rb') as file:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    self.file.write('\n')
+
+    @staticmethod
+    def key(record):
+        return record['fingerprint'], record['mode'], record['algorithm'], record['problem']
+
+    def get(self, fingerprint, mode, algorithm, problem):
+        """Record of a completed cell, or None."""
+        return self.records.get((fingerprint, mode, algorithm, problem))
+
+    def runtimes(self):
+        """Logged runtimes of the (mode, algorithm, problem) cells, for any fingerprint."""
+        return {key[1:]: record['time'] for key, record in self.records.items()
+            if record.get('time') is not None and np.isfinite(record['time'])}
+
+    def append(self, record):
+        """Durably append the record of a completed cell."""
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.records[self.key(record)] = record
+
+    def close(self):
+        self.file.close()
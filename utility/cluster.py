@@ -0,0 +1,179 @@
+"""
+Distribution of benchmark tasks over several machines.
+
+A coordinator serves the tasks over a multiprocessing.connection listener
+(TCP with an HMAC authentication key). Agents on any number of machines
+connect to it and solve the tasks with a local Scheduler, which requests
+new tasks whenever its workers are idle and sends back every result.
+The coordinator reports the results as they arrive, so they end up in the
+same outputs as those of a local sweep.
+
+Every task handed out is leased to the agent. When the connection of an
+agent is lost, its leased tasks are handed out again; the same happens
+when a lease expires (e.g., the machine of the agent became unreachable
+without closing the connection). If a task is completed twice, the first
+result counts. Agents present a value (e.g., fingerprints of the
+algorithms) which must equal the coordinator's, so all results are
+computed by the same code.
+
+Messages from agents are ('hello', value), ('request', n) (answered with
+a list of at most n tasks, or None when all tasks are completed) and
+('result', task, result, error).
+"""
+import multiprocessing.connection
+import multiprocessing.util
+import os
+import threading
+import time
+
+
+def parseAddress(text):
+    """(host, port) for a HOST:PORT string."""
+    host, port = text.rsplit(':', 1)
+    return host, int(port)
+
+
+def authkey():
+    """Authentication key shared by coordinator and agents."""
+    key = os.environ.get('BENCHMARK_AUTHKEY')
+    if not key:
+        raise RuntimeError("Set the environment variable BENCHMARK_AUTHKEY to a shared secret")
+    return key.encode()
+
+
+class Coordinator:
+    """
+    Serve tasks to agents.
+
+    address : (host, port) to listen on.
+    hello : value agents have to present.
+    leaseTime : seconds after which an uncompleted task is handed out again
+        (None for no expiry; lost connections are always detected).
+    """
+    # Seconds between checks for expired leases
+    pollInterval = 5
+
+    def __init__(self, address, hello, leaseTime=None):
+        self.address = address
+        self.hello = hello
+        self.leaseTime = leaseTime
+        self.condition = threading.Condition()
+
+    def run(self, tasks, report=None):
+        """
+        Serve the tasks (in the given order) until all are completed and
+        return a list of (task, error) for the failed ones. report is called
+        as in Scheduler.run (in a serving thread, one call at a time).
+        """
+        self.pending = list(tasks)
+        self.remaining = set(self.pending)
+        self.leases = {}  # task -> (agent, deadline)
+        self.report = report
+        self.failed = []
+
+        listener = multiprocessing.connection.Listener(self.address, authkey=authkey())
+        print(f"Serving {len(self.pending)} tasks on {listener.address}")
+        threading.Thread(target=self.accept, args=(listener,), daemon=True).start()
+        with self.condition:
+            while self.remaining:
+                self.condition.wait(self.pollInterval)
+                self.expire()
+        return self.failed
+
+    def accept(self, listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError) as error:
+                print(f"Rejected connection: {error!r}")
+                continue
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        """Handle the messages of one agent."""
+        agent = object()
+        try:
+            if conn.recv() != ('hello', self.hello):
+                conn.send(False)
+                print("Rejected agent with different algorithms or parameters")
+                return
+            conn.send(True)
+            while True:
+                message = conn.recv()
+                with self.condition:
+                    if message[0] == 'request':
+                        conn.send(self.lease(agent, message[1]))
+                    elif message[0] == 'result':
+                        self.complete(*message[1:])
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            with self.condition:
+                self.requeue(lambda owner, deadline: owner is agent, "agent lost")
+
+    def lease(self, agent, n):
+        """Hand out at most n tasks to agent."""
+        if not self.remaining:
+            return None
+        tasks, self.pending = self.pending[:n], self.pending[n:]
+        deadline = None if self.leaseTime is None else time.monotonic() + self.leaseTime
+        for task in tasks:
+            self.leases[task] = agent, deadline
+        return tasks
+
+    def complete(self, task, result, error):
+        if task not in self.remaining:
+            return  # Completed before by another agent
+        self.remaining.remove(task)
+        self.leases.pop(task, None)
+        if task in self.pending:
+            self.pending.remove(task)
+        if error is not None:
+            print(f"Task {task} failed:\n{error}")
+            self.failed.append((task, error))
+        if self.report is not None:
+            self.report(task, result, error)
+        self.condition.notify_all()
+
+    def expire(self):
+        now = time.monotonic()
+        self.requeue(lambda owner, deadline: deadline is not None and deadline < now, "lease expired")
+
+    def requeue(self, stale, reason):
+        """Hand out the tasks whose lease (agent, deadline) is stale again (first)."""
+        tasks = [task for task, lease in self.leases.items() if stale(*lease)]
+        for task in tasks:
+            del self.leases[task]
+            print(f"Requeueing task {task} ({reason})")
+        self.pending[:0] = tasks
+
+
+def agent(address, hello, scheduler):
+    """
+    Solve the tasks of the coordinator at address with scheduler until all
+    tasks are completed or the coordinator is gone.
+    """
+    conn = multiprocessing.connection.Client(address, authkey=authkey())
+    # Workers forked by the scheduler must not keep the connection open
+    multiprocessing.util.register_after_fork(conn, type(conn).close)
+    conn.send(('hello', hello))
+    if not conn.recv():
+        raise RuntimeError("Coordinator rejected this agent (different algorithms or parameters)")
+
+    def refill(n):
+        try:
+            conn.send(('request', n))
+            return conn.recv()
+        except (EOFError, OSError):
+            return None
+
+    def report(task, result, error):
+        try:
+            conn.send(('result', task, result, error))
+        except OSError:
+            pass  # The coordinator is gone; refill ends the run
+
+    failed = scheduler.run([], report, refill)
+    conn.close()
+    return failed
@@ -1,111 +1,289 @@
 """
 Utility functions and classes to reduce code duplication.
+
+Limited memory pairs are kept in a ring buffer: row `i` of `S` and `Y`
+holds the pair stored in slot `i`, and `head` is the slot of the oldest
+pair. An update therefore only overwrites one row (and one row/column of
+each product matrix) instead of shifting the whole memory. The method
+`order` returns the slots in logical (oldest to newest) order, which is
+the order expected by the compact representations.
+
+Direction calculators may keep quantities that do not depend on the
+regularization parameter in `cache`. The cache is cleared whenever a new
+pair is stored, so it is valid for the current memory only.
+
+The pairs may be stored in single precision (parameters.lmDtype) to halve
+their memory footprint and traffic. NumPy has no mixed-precision matrix
+products and upcasting the pairs costs more than it saves, so products
+with the stored pairs are then computed in single precision on blocks of
+columns and accumulated in double precision (`rowProducts`,
+`rowCombination`). The Gram matrices are computed from the rounded pairs
+in double precision, and everything else stays in double precision.
+
+For very large n, the pairs can be kept in memory-mapped temporary files
+in a scratch directory (parameters.lmScratch). The products then stream
+through the pairs in blocks of columns, so the direction calculators work
+unchanged and only the blocks in use have to be resident.
 """
+import tempfile
 import numpy as np
+import scipy.linalg
+from . import parameters
+from .workspace import Workspace
 
 
-def updateData1(v, mUpd, vn):
-    """Cyclically update limited memory vectors (e.g., sty)"""
-    m = v.shape[0]
-    if (mUpd >= m):
-        v[:m-1] = v[1:]
-        v[m-1] = vn
-    else:
-        v[mUpd] = vn
+# Number of columns per block for single-precision or memory-mapped storage
+blockSize = 8192
+# Dimension below which the pairs of a subset of batch instances are gathered
+# into a copy for one stacked product; above it, the copy costs more than a
+# product per instance
+gatherDimension = 4000
 
 
-def updateData2(S, mUpd, sn):
-    """Cyclically update limited memory matrices (e.g., S)"""
-    m = S.shape[1]
-    if (mUpd >= m):
-        S[:, :m-1] = S[:, 1:]
-        S[:, m-1] = sn
-    else:
-        S[:, mUpd] = sn
+def pairStorage(m, n, dtype, scratch):
+    """Zero (m, n) array for the pairs, memory-mapped in the directory scratch if given."""
+    if scratch is None:
+        return np.zeros((m, n), dtype=dtype)
+    return np.memmap(tempfile.TemporaryFile(dir=scratch), dtype=dtype, mode='w+', shape=(m, n))
 
 
-def updateData3(STY, mUpd, STyn, YTsn=None):
-    """Cyclically update limited memory product matrices (e.g., STY)"""
-    m = STY.shape[0]
-    if (mUpd >= m):
-        STY[:m-1, :m-1] = STY[1:, 1:]
-        STY[:, m-1] = STyn
-        STY[m-1, :] = STyn if YTsn is None else YTsn
-    else:
-        STY[:, mUpd] = STyn
-        STY[mUpd, :] = STyn if YTsn is None else YTsn
+def blocked(X):
+    return X.dtype != np.float64 or isinstance(X, np.memmap)
+
+
+def rowProducts(X, v, upcast=False):
+    """
+    Compute X @ v, accumulated in double precision. For single-precision X,
+    the blocks are multiplied in single precision unless upcast is True.
+    """
+    if not blocked(X):
+        return X @ v
+    upcast = upcast and X.dtype != np.float64
+    if X.dtype != np.float64 and not upcast:
+        v = v.astype(X.dtype)
+    out = np.zeros(X.shape[0])
+    for j in range(0, X.shape[1], blockSize):
+        block = X[:, j:j + blockSize]
+        out += (block.astype(np.float64) if upcast else block) @ v[j:j + blockSize]
+    return out
 
 
-def twoLoopRecursion(S, Y, rho, mUpd, gamma, rhs):
-    """Compute trial step using the standard two-loop recursion"""
-    alpha = np.zeros(S.shape[1])
-    x = rhs.copy()
+def rowCombination(q, X, out=None):
+    """Compute q @ X as double-precision vector (in blocks for single-precision or mapped X)."""
+    if not blocked(X):
+        return np.matmul(q, X, out=out)
+    q = q.astype(X.dtype)
+    out = np.empty(X.shape[1]) if out is None else out
+    for j in range(0, X.shape[1], blockSize):
+        out[j:j + blockSize] = q @ X[:, j:j + blockSize]
+    return out
+
+
+def twoLoopRecursion(S, Y, rho, order, gamma, rhs, out=None, tmp=None):
+    """
+    Compute trial step using the standard two-loop recursion (into out if
+    given, with the scratch vector tmp if given)
+    """
+    alpha = np.zeros(S.shape[0])
+    if out is None:
+        x = rhs.copy()
+    else:
+        x = out
+        x[:] = rhs
+    tmp = np.empty_like(x) if tmp is None else tmp
 
     # Two-loop recursion
-    for i in reversed(range(mUpd)):
-        alpha[i] = np.dot(S[:, i], x) / rho[i]
-        x -= alpha[i] * Y[:, i]
+    for i in reversed(order):
+        alpha[i] = np.dot(S[i], x) / rho[i]
+        x -= np.multiply(Y[i], alpha[i], out=tmp)
     x /= gamma
-    for i in range(mUpd):
-        beta = np.dot(Y[:, i], x) / rho[i]
-        x += (alpha[i] - beta) * S[:, i]
-    
+    for i in order:
+        beta = np.dot(Y[i], x) / rho[i]
+        x += np.multiply(S[i], alpha[i] - beta, out=tmp)
+
     return x
 
 
-class LmData:
-    """Basic limited-memory data structure"""
-    def __init__(self, n, m):
+def shiftedTwoLoopRecursion(S, Y, sts, sty, order, gamma, mu, rhs, out=None, tmp=None):
+    """
+    Two-loop recursion with the shifted pairs (s, y + mu*s) and the scaling
+    gamma + mu, without forming the shifted pairs: their products are
+    y^T x + mu*s^T x and sty + mu*sts, and the update with y + mu*s is
+    applied as two axpys through tmp.
+    """
+    alpha = np.zeros(S.shape[0])
+    if out is None:
+        x = rhs.copy()
+    else:
+        x = out
+        x[:] = rhs
+    tmp = np.empty_like(x) if tmp is None else tmp
+
+    for i in reversed(order):
+        alpha[i] = np.dot(S[i], x) / (sty[i] + mu * sts[i])
+        x -= np.multiply(Y[i], alpha[i], out=tmp)
+        x -= np.multiply(S[i], mu * alpha[i], out=tmp)
+    x /= gamma + mu
+    for i in order:
+        beta = (np.dot(Y[i], x) + mu * np.dot(S[i], x)) / (sty[i] + mu * sts[i])
+        x += np.multiply(S[i], alpha[i] - beta, out=tmp)
+
+    return x
+
+
+def compactInverse(data, mu, g, out=None):
+    """
+    Apply the compact representation of the inverse L-BFGS matrix built from
+    the shifted pairs (s, y + mu*s) and the scaling gamma + mu to g. This is the
+    same operator as in twoLoopRecursion but it needs only the products
+    [S Y]^T g and [S Y] p and a triangular solve with the memory size.
+    data must provide the product matrices of ExtendedLmData. The result is
+    written to out if given (using the buffer 'tmp' of data.workspace).
+    """
+    theta = 1 / (data.gamma + mu)
+    STS, STY, YTY = data.cachedLogical('STS'), data.cachedLogical('STY'), data.cachedLogical('YTY')
+    STg, YTg = data.cachedProject('S', g), data.cachedProject('Y', g)
+
+    # Products of the shifted pairs
+    STYh = STY + mu * STS
+    YhTYh = YTY + mu * (STY + STY.T) + mu**2 * STS
+    YhTg = YTg + mu * STg
+
+    # H g = theta g + S u - theta Yh q with q = R^{-1} S^T g
+    R = np.triu(STYh)
+    q = scipy.linalg.solve_triangular(R, STg)
+    u = scipy.linalg.solve_triangular(R, np.diag(STYh) * q + theta * (YhTYh @ q - YhTg), trans='T')
+    if out is None:
+        return theta * g + data.combine(data.S, u - theta * mu * q) - theta * data.combine(data.Y, q)
+    tmp = data.workspace('tmp')
+    np.multiply(g, theta, out=out)
+    out += data.combine(data.S, u - theta * mu * q, tmp)
+    tmp = data.combine(data.Y, q, tmp)
+    tmp *= theta
+    out -= tmp
+    return out
+
+
+class RingMemory:
+    """Slot bookkeeping shared by all limited-memory data structures."""
+    def __init__(self, n, m, dtype=None, scratch=None):
         self.gamma = 1
-        self.S = np.zeros((n, m))
-        self.Y = np.zeros((n, m))
-        self.sts = np.zeros(m)
-        self.sty = np.zeros(m)
-        self.yty = np.zeros(m)
         self.n = n
         self.m = m
+        self.dtype = np.dtype(parameters.lmDtype if dtype is None else dtype)
+        self.scratch = parameters.lmScratch if scratch is None else scratch
         self.mUpd = 0
+        self.head = 0
+        self.cache = {}
+        self.workspace = Workspace(n)
+
+    def nextSlot(self):
+        """Return the slot for a new pair, advance the ring and clear the cache."""
+        self.cache.clear()
+        if (self.mUpd >= self.m):
+            slot = self.head
+            self.head = (self.head + 1) % self.m
+        else:
+            slot = self.mUpd
+            self.mUpd += 1
+        return slot
+
+    def pairStorage(self):
+        return pairStorage(self.m, self.n, self.dtype, self.scratch)
+
+    def rounded(self, v):
+        """v rounded to the storage precision (in double precision)."""
+        if self.dtype == np.float64:
+            return v
+        return v.astype(self.dtype).astype(np.float64)
+
+    def order(self):
+        """Slots of the stored pairs from oldest to newest."""
+        if (self.head == 0):
+            return np.arange(self.mUpd)
+        return (self.head + np.arange(self.mUpd)) % self.m
+
+    def logical(self, v):
+        """Copy of a slot-indexed vector or product matrix in logical order."""
+        o = self.order()
+        return v[o] if v.ndim == 1 else v[np.ix_(o, o)]
+
+    def project(self, X, g):
+        """Compute X^T g with the result in logical order."""
+        return rowProducts(X[:self.mUpd], g)[self.order()]
+
+    def combine(self, X, p, out=None):
+        """Compute X p for coefficients p given in logical order (into out if given)."""
+        q = np.empty(self.mUpd)
+        q[self.order()] = p
+        return rowCombination(q, X[:self.mUpd], out)
+
+    def cachedLogical(self, name):
+        """Logical-order copy of the attribute `name`, cached until the next update."""
+        if name not in self.cache:
+            self.cache[name] = self.logical(getattr(self, name))
+        return self.cache[name]
+
+    def cachedProject(self, name, g):
+        """Projection of g onto the attribute `name`, cached until the next update or a new g."""
+        g0, projections = self.cache.get('projections', (None, None))
+        if g0 is not g:
+            projections = {}
+            self.cache['projections'] = (g, projections)
+        if name not in projections:
+            projections[name] = self.project(getattr(self, name), g)
+        return projections[name]
+
+
+class LmData(RingMemory):
+    """Basic limited-memory data structure"""
+    def __init__(self, n, m, dtype=None, scratch=None):
+        super().__init__(n, m, dtype, scratch)
+        self.S = self.pairStorage()
+        self.Y = self.pairStorage()
+        self.sts = np.zeros(m)
+        self.sty = np.zeros(m)
+        self.yty = np.zeros(m)
 
     def update(self, sn, yn, gamma):
         self.gamma = gamma
-        updateData2(self.S, self.mUpd, sn)
-        updateData2(self.Y, self.mUpd, yn)
-        updateData1(self.sts, self.mUpd, np.dot(sn, sn))
-        updateData1(self.sty, self.mUpd, np.dot(sn, yn))
-        updateData1(self.yty, self.mUpd, np.dot(yn, yn))
-        self.mUpd = min(self.mUpd+1, self.m)
+        sn, yn = self.rounded(sn), self.rounded(yn)
+        k = self.nextSlot()
+        self.S[k] = sn
+        self.Y[k] = yn
+        self.sts[k] = np.dot(sn, sn)
+        self.sty[k] = np.dot(sn, yn)
+        self.yty[k] = np.dot(yn, yn)
 
 
-class ExtendedLmData:
+class ExtendedLmData(RingMemory):
     """Extended limited-memory data structure"""
-    def __init__(self, n, m):
-        self.gamma = 1
-        self.S = np.zeros((n, m))
-        self.Y = np.zeros((n, m))
+    def __init__(self, n, m, dtype=None, scratch=None):
+        super().__init__(n, m, dtype, scratch)
+        self.S = self.pairStorage()
+        self.Y = self.pairStorage()
         self.STS = np.zeros((m, m))
         self.STY = np.zeros((m, m))
         self.YTY = np.zeros((m, m))
-        self.n = n
-        self.m = m
-        self.mUpd = 0
-    
+
     def update(self, sn, yn, gamma):
         self.gamma = gamma
-        updateData2(self.S, self.mUpd, sn)
-        updateData2(self.Y, self.mUpd, yn)
-        updateData3(self.STS, self.mUpd, self.S.T @ sn)
-        updateData3(self.STY, self.mUpd, self.S.T @ yn, self.Y.T @ sn)
-        updateData3(self.YTY, self.mUpd, self.Y.T @ yn)
-        self.mUpd = min(self.mUpd+1, self.m)
+        sn, yn = self.rounded(sn), self.rounded(yn)
+        k = self.nextSlot()
+        self.S[k] = sn
+        self.Y[k] = yn
+        self.STS[:, k] = self.STS[k, :] = rowProducts(self.S, sn, upcast=True)
+        self.STY[:, k] = rowProducts(self.S, yn, upcast=True)
+        self.STY[k, :] = rowProducts(self.Y, sn, upcast=True)
+        self.YTY[:, k] = self.YTY[k, :] = rowProducts(self.Y, yn, upcast=True)
 
 
-class NormalizedLmData:
+class NormalizedLmData(RingMemory):
     """Like ExtendedLmData but the matrices are kept normalized."""
-    def __init__(self, n, m):
-        self.gamma = 1
-
-        self.Sn = np.zeros((n, m))
-        self.Yn = np.zeros((n, m))
+    def __init__(self, n, m, dtype=None, scratch=None):
+        super().__init__(n, m, dtype, scratch)
+        self.Sn = self.pairStorage()
+        self.Yn = self.pairStorage()
         self.SnTSn = np.zeros((m, m))
         self.SnTYn = np.zeros((m, m))
         self.YnTYn = np.zeros((m, m))
@@ -113,22 +291,133 @@ class NormalizedLmData:
         self.sty = np.zeros(m)
         self.yty = np.zeros(m)
 
-        self.n = n
-        self.m = m
-        self.mUpd = 0
-    
     def update(self, sn, yn, gamma):
         self.gamma = gamma
         norm_sn = np.linalg.norm(sn)
         norm_yn = np.linalg.norm(yn)
 
-        updateData2(self.Sn, self.mUpd, sn / norm_sn)
-        updateData2(self.Yn, self.mUpd, yn / norm_yn)
-        updateData3(self.SnTSn, self.mUpd, self.Sn.T @ (sn / norm_sn))
-        updateData3(self.SnTYn, self.mUpd, self.Sn.T @ (yn / norm_yn), self.Yn.T @ (sn / norm_sn))
-        updateData3(self.YnTYn, self.mUpd, self.Yn.T @ (yn / norm_yn))
-        updateData1(self.sts, self.mUpd, np.dot(sn, sn))
-        updateData1(self.sty, self.mUpd, np.dot(sn, yn))
-        updateData1(self.yty, self.mUpd, np.dot(yn, yn))
+        k = self.nextSlot()
+        np.divide(sn, norm_sn, out=self.Sn[k])
+        np.divide(yn, norm_yn, out=self.Yn[k])
+        self.SnTSn[:, k] = self.SnTSn[k, :] = rowProducts(self.Sn, self.Sn[k], upcast=True)
+        self.SnTYn[:, k] = rowProducts(self.Sn, self.Yn[k], upcast=True)
+        self.SnTYn[k, :] = rowProducts(self.Yn, self.Sn[k], upcast=True)
+        self.YnTYn[:, k] = self.YnTYn[k, :] = rowProducts(self.Yn, self.Yn[k], upcast=True)
+        self.sts[k] = np.dot(sn, sn)
+        self.sty[k] = np.dot(sn, yn)
+        self.yty[k] = np.dot(yn, yn)
+
+
+class BatchLmData:
+    """
+    Extended limited-memory data of K independent instances. Every instance
+    has its own ring buffer (head, mUpd) in the stacked arrays S, Y of shape
+    (K, m, n) and STS, STY, YTY of shape (K, m, m). In logical order, the
+    unused slots of instances with mUpd < m come last and hold zeros.
+
+    The methods act on the instances given by an index array rows (sorted,
+    e.g. the active instances of a batch) and return results of length
+    len(rows). For n >= gatherDimension, the pairs S, Y of a subset are not
+    gathered into a copy: their products are computed instance by instance
+    on views.
+    """
+    def __init__(self, K, n, m):
+        self.gamma = np.ones(K)
+        self.S = np.zeros((K, m, n))
+        self.Y = np.zeros((K, m, n))
+        self.STS = np.zeros((K, m, m))
+        self.STY = np.zeros((K, m, m))
+        self.YTY = np.zeros((K, m, m))
+        self.K = K
+        self.n = n
+        self.m = m
+        self.mUpd = np.zeros(K, dtype=int)
+        self.head = np.zeros(K, dtype=int)
+
+    def update(self, mask, Sn, Yn, gamma):
+        """Store the pairs (Sn[k], Yn[k]) and gamma[k] of all instances k in mask."""
+        idx = np.flatnonzero(mask)
+        full = self.mUpd[idx] >= self.m
+        slots = np.where(full, self.head[idx], self.mUpd[idx])
+        self.head[idx] = np.where(full, (self.head[idx] + 1) % self.m, self.head[idx])
+        self.mUpd[idx] = np.minimum(self.mUpd[idx] + 1, self.m)
+        self.gamma[idx] = gamma[idx]
+        self.S[idx, slots] = Sn[idx]
+        self.Y[idx, slots] = Yn[idx]
+        STsn = self.project(self.S, Sn[idx], idx)
+        YTyn = self.project(self.Y, Yn[idx], idx)
+        self.STS[idx, :, slots] = self.STS[idx, slots, :] = STsn
+        self.STY[idx, :, slots] = self.project(self.S, Yn[idx], idx)
+        self.STY[idx, slots, :] = self.project(self.Y, Sn[idx], idx)
+        self.YTY[idx, :, slots] = self.YTY[idx, slots, :] = YTyn
+
+    def order(self, rows):
+        """Slots of the instances rows from oldest to newest, shape (len(rows), m)."""
+        return (self.head[rows, None] + np.arange(self.m)) % self.m
+
+    def valid(self, rows):
+        """Mask of the logical positions holding a pair, shape (len(rows), m)."""
+        return np.arange(self.m) < self.mUpd[rows, None]
+
+    def logical(self, v, rows):
+        """Copy of slot-indexed vectors (K, m) or product matrices (K, m, m) of the instances rows in logical order."""
+        o = self.order(rows)
+        if v.ndim == 2:
+            return np.take_along_axis(v[rows], o, 1)
+        return v[rows[:, None, None], o[:, :, None], o[:, None, :]]
+
+    def project(self, X, G, rows):
+        """Compute X[k]^T G[j] for the instances k = rows[j], in slot order."""
+        if len(rows) == self.K:
+            return (X @ G[..., None])[..., 0]
+        if self.n < gatherDimension:
+            return (X[rows] @ G[..., None])[..., 0]
+        P = np.empty((len(rows), self.m))
+        for j, k in enumerate(rows):
+            np.dot(X[k], G[j], out=P[j])
+        return P
+
+    def projectLogical(self, X, G, rows):
+        """Compute X[k]^T G[j] for the instances k = rows[j], in logical order."""
+        return np.take_along_axis(self.project(X, G, rows), self.order(rows), 1)
+
+    def combine(self, X, P, rows):
+        """Compute X[k] P[j] for the instances k = rows[j] and coefficients P given in logical order."""
+        q = np.empty_like(P)
+        np.put_along_axis(q, self.order(rows), P, 1)
+        if len(rows) == self.K:
+            return (q[:, None, :] @ X)[:, 0, :]
+        if self.n < gatherDimension:
+            return (q[:, None, :] @ X[rows])[:, 0, :]
+        D = np.empty((len(rows), self.n))
+        for j, k in enumerate(rows):
+            np.dot(q[j], X[k], out=D[j])
+        return D
+
+
+def compactInverseBatch(data, mu, G, rows):
+    """
+    Batched version of compactInverse for the instances rows of BatchLmData
+    with one shift mu[j] and gradient G[j] per instance rows[j]. Unused
+    memory slots are padded with identity rows, which gives zero
+    coefficients for them.
+    """
+    theta = 1 / (data.gamma[rows] + mu)
+    STS, STY, YTY = data.logical(data.STS, rows), data.logical(data.STY, rows), data.logical(data.YTY, rows)
+    STg, YTg = data.projectLogical(data.S, G, rows), data.projectLogical(data.Y, G, rows)
+    mu3 = mu[:, None, None]
+
+    # Products of the shifted pairs
+    STYh = STY + mu3 * STS
+    YhTYh = YTY + mu3 * (STY + np.swapaxes(STY, 1, 2)) + mu3**2 * STS
+    YhTg = YTg + mu[:, None] * STg
 
-        self.mUpd = min(self.mUpd+1, self.m)
+    # H g = theta g + S u - theta Yh q with q = R^{-1} S^T g
+    i = np.arange(data.m)
+    R = np.triu(STYh)
+    R[:, i, i] = np.where(data.valid(rows), R[:, i, i], 1)
+    q = np.linalg.solve(R, STg[..., None])[..., 0]
+    rhs = STYh[:, i, i] * q + theta[:, None] * ((YhTYh @ q[..., None])[..., 0] - YhTg)
+    u = np.linalg.solve(np.swapaxes(R, 1, 2), rhs[..., None])[..., 0]
+    return theta[:, None] * G + data.combine(data.S, u - (theta * mu)[:, None] * q, rows) \
+        - theta[:, None] * data.combine(data.Y, q, rows)
@@ -1,40 +1,64 @@
 """
-Generic line-search algorithms.
+Generic line-search algorithms. The arguments are as for the generic
+regularization methods, plus the line search
+lineSearch(x, oracle, d, fx, gx, workspace), which returns the accepted
+point in the workspace buffer 'xtry'.
 """
 import numpy as np
-from . import parameters
+from . import parameters, nonmonotone
 
 
-def genericMonotone(lmData, updateCalculator, directionCalculator, lineSearch, f, Df, x):
+def genericMonotone(lmData, updateCalculator, directionCalculator, lineSearch, oracle, x, tracer=None):
     """Generic monotone line-search algorithm."""
     iter = np.array([0, 1])
-    fx, gx = f(x), Df(x)
+    fx, gx = oracle.valueAndGradient(x)
 
+    ws = lmData.workspace
     while not stoppingTest(iter, gx):
+        if tracer is not None:
+            tracer.begin(oracle)
         d = directionCalculator(lmData, gx)
-        x, ok, fx, gx, it, sn, yn = lineSearch(x, f, Df, d, fx, gx)
+        if tracer is not None:
+            tracer.endDirection()
+        fxOld = fx
+        x, ok, fx, gx, it, sn, yn = lineSearch(x, oracle, d, fx, gx, ws)
         iter += [1, it]
+        if tracer is not None:
+            tracer.record(iter, fx, gx, np.nan, d, np.nan, fxOld - fx, ok)
         if not ok:
             break
+        ws.swap('x', 'xtry')
         updateCalculator(lmData, sn, yn)
 
     return [x, iter]
 
 
-def genericNonmonotone(lmData, updateCalculator, directionCalculator, lineSearch, f, Df, x):
-    """Generic nonmonotone line-search algorithm."""
+def genericNonmonotone(lmData, updateCalculator, directionCalculator, lineSearch, oracle, x, history=None, tracer=None):
+    """
+    Generic nonmonotone line-search algorithm. The reference values are
+    provided by history (see utility.nonmonotone).
+    """
     iter = np.array([0, 1])
-    fx, gx = f(x), Df(x)
-    fxList = np.append(np.zeros(parameters.nonmon-1), fx)
+    fx, gx = oracle.valueAndGradient(x)
+    history = nonmonotone.default() if history is None else history
+    history.push(fx)
 
+    ws = lmData.workspace
     while not stoppingTest(iter, gx):
+        if tracer is not None:
+            tracer.begin(oracle)
         d = directionCalculator(lmData, gx)
-        fxRef = fx if iter[0]+1 < parameters.nonmon else max(fxList)
-        x, ok, fx, gx, it, sn, yn = lineSearch(x, f, Df, d, fxRef, gx)
-        fxList = np.append(fxList[1:], fx)
+        if tracer is not None:
+            tracer.endDirection()
+        fxOld = fx
+        x, ok, fx, gx, it, sn, yn = lineSearch(x, oracle, d, history.reference(), gx, ws)
+        history.push(fx)
         iter += [1, it]
+        if tracer is not None:
+            tracer.record(iter, fx, gx, np.nan, d, np.nan, fxOld - fx, ok)
         if not ok:
             break
+        ws.swap('x', 'xtry')
         updateCalculator(lmData, sn, yn)
 
     return [x, iter]
@@ -1,135 +1,173 @@
+"""
+More-Thuente line search (port of CVSRCH/CSTEP from MINPACK).
+
+LineSearch is a reusable search object which keeps its parameters and a
+preallocated trial point between calls, and cstep works on scalars
+without assembling temporary arrays.
+cvsrch is kept as a function interface with the original argument list.
+"""
 import numpy as np
 import math
 
+
 #function [x,f,g,stp,info,nfev] ...
-def cvsrch(fcn, n, x, f, g, s, stp, ftol, gtol, xtol, stpmin, stpmax, maxfev):
-    p5 = .5
-    p66 = .66
-    xtrapf = 4
-    info = 0
-    infoc = 1
+def cvsrch(oracle, n, x, f, g, s, stp, ftol, gtol, xtol, stpmin, stpmax, maxfev):
+    return LineSearch(n, ftol, gtol, xtol, stpmin, stpmax, maxfev)(oracle, x, f, g, s, stp)
 
-    # Compute the initial gradient in the search direction
-    # and check that s is a descent direction.
-    dginit = np.dot(g, s)
-    if (dginit >= 0.0):
-        return x, f, g, 0, 0, 0
 
-    # Initialize local variables.
-    brackt = 0
-    stage1 = 1
-    nfev = 0
-    finit = f
-    dgtest = ftol*dginit
-    width = stpmax - stpmin
-    width1 = 2*width
-    wa = x
+class LineSearch:
+    """
+    More-Thuente line search for problems of dimension n. The trial points
+    are assembled in a preallocated array which is passed to the oracle, so
+    the oracle must not keep references to its argument.
+    """
+    def __init__(self, n, ftol, gtol, xtol, stpmin, stpmax, maxfev):
+        self.ftol = ftol
+        self.gtol = gtol
+        self.xtol = xtol
+        self.stpmin = stpmin
+        self.stpmax = stpmax
+        self.maxfev = maxfev
+        self.trial = np.empty(n)
 
-    # The variables stx, fx, dgx contain the values of the step, 
-    # function, and directional derivative at the best step.
-    # The variables sty, fy, dgy contain the value of the step,
-    # function, and derivative at the other endpoint of
-    # the interval of uncertainty.
-    # The variables stp, f, dg contain the values of the step,
-    # function, and derivative at the current step.
-    stx = 0.0
-    fx = finit
-    dgx = dginit
-    sty = 0.0
-    fy = finit
-    dgy = dginit
+    def __call__(self, oracle, x, f, g, s, stp, out=None):
+        """
+        Search along s from x and return x, f, g, stp, info, nfev. The final
+        point is copied to out if given (else to a new array).
+        """
+        return self.search(oracle, x, f, g, s, stp, self.ftol, self.gtol,
+            self.xtol, self.stpmin, self.stpmax, self.maxfev, out)
 
-    # Start of iteration.
-    while (1):
-        # Set the minimum and maximum steps to correspond
-        # to the present interval of uncertainty.
-        if (brackt):
-            stmin = min(stx,sty)
-            stmax = max(stx,sty)
-        else:
-            stmin = stx
-            stmax = stp + xtrapf*(stp - stx)
-        
-        # Force the step to be within the bounds stpmax and stpmin.
-        stp = max(stp,stpmin)
-        stp = min(stp,stpmax)
-        
-        # If an unusual termination is to occur then let 
-        # stp be the lowest point obtained so far.
-        if ((brackt and (stp <= stmin or stp >= stmax)) \
-            or nfev >= maxfev-1 or infoc == 0 or (brackt and stmax-stmin <= xtol*stmax)):
-            stp = stx
+    def search(self, oracle, x, f, g, s, stp, ftol, gtol, xtol, stpmin, stpmax, maxfev, out=None):
+        p5 = .5
+        p66 = .66
+        xtrapf = 4
+        info = 0
+        infoc = 1
 
-        # Evaluate the function and gradient at stp
-        # and compute the directional derivative.
-        x = wa + stp * s
-        f, g = fcn(x)
-        nfev = nfev + 1
-        dg = np.dot(g, s)
-        ftest1 = finit + stp*dgtest
+        # Compute the initial gradient in the search direction
+        # and check that s is a descent direction.
+        dginit = np.dot(g, s)
+        if (dginit >= 0.0):
+            return x, f, g, 0, 0, 0
 
-        # Test for convergence.
-        if ((brackt and (stp <= stmin or stp >= stmax)) or infoc == 0):
-            info = 6
-        if (stp == stpmax and f <= ftest1 and dg <= dgtest):
-            info = 5
-        if (stp == stpmin and (f > ftest1 or dg >= dgtest)):
-            info = 4
-        if (nfev >= maxfev):
-            info = 3
-        if (brackt and stmax-stmin <= xtol*stmax):
-            info = 2
-        if (f <= ftest1 and abs(dg) <= gtol*(-dginit)):
-            info = 1
+        # Initialize local variables.
+        brackt = 0
+        stage1 = 1
+        nfev = 0
+        finit = f
+        dgtest = ftol*dginit
+        width = stpmax - stpmin
+        width1 = 2*width
+        wa = x
 
-        # Check for termination.
-        if (info != 0):
-            return x, f, g, stp, info, nfev
+        # The variables stx, fx, dgx contain the values of the step, 
+        # function, and directional derivative at the best step.
+        # The variables sty, fy, dgy contain the value of the step,
+        # function, and derivative at the other endpoint of
+        # the interval of uncertainty.
+        # The variables stp, f, dg contain the values of the step,
+        # function, and derivative at the current step.
+        stx = 0.0
+        fx = finit
+        dgx = dginit
+        sty = 0.0
+        fy = finit
+        dgy = dginit
 
-        # In the first stage we seek a step for which the modified
-        # function has a nonpositive value and nonnegative derivative.
-        if (stage1 and f <= ftest1 and dg >= min(ftol,gtol)*dginit):
-            stage1 = 0
+        # Start of iteration.
+        while (1):
+            # Set the minimum and maximum steps to correspond
+            # to the present interval of uncertainty.
+            if (brackt):
+                stmin = min(stx,sty)
+                stmax = max(stx,sty)
+            else:
+                stmin = stx
+                stmax = stp + xtrapf*(stp - stx)
+            
+            # Force the step to be within the bounds stpmax and stpmin.
+            stp = max(stp,stpmin)
+            stp = min(stp,stpmax)
+            
+            # If an unusual termination is to occur then let 
+            # stp be the lowest point obtained so far.
+            if ((brackt and (stp <= stmin or stp >= stmax)) \
+                or nfev >= maxfev-1 or infoc == 0 or (brackt and stmax-stmin <= xtol*stmax)):
+                stp = stx
 
-        # A modified function is used to predict the step only if
-        # we have not obtained a step for which the modified
-        # function has a nonpositive function value and nonnegative 
-        # derivative, and if a lower function value has been  
-        # obtained but the decrease is not sufficient.
-        if (stage1 and f <= fx and f > ftest1):
-            # Define the modified function and derivative values.
-            fm = f - stp*dgtest
-            fxm = fx - stx*dgtest
-            fym = fy - sty*dgtest
-            dgm = dg - dgtest
-            dgxm = dgx - dgtest
-            dgym = dgy - dgtest
+            # Evaluate the function and gradient at stp
+            # and compute the directional derivative.
+            x = np.multiply(s, stp, out=self.trial)
+            x += wa
+            f, g = oracle.valueAndGradient(x)
+            nfev = nfev + 1
+            dg = np.dot(g, s)
+            ftest1 = finit + stp*dgtest
 
-            # Call cstep to update the interval of uncertainty 
-            # and to compute the new step.
-            stx, fxm, dgxm, sty, fym, dgym, stp, fm, dgm, brackt, infoc = \
-                cstep(stx,fxm,dgxm,sty,fym,dgym,stp,fm,dgm, brackt,stmin,stmax)
+            # Test for convergence.
+            if ((brackt and (stp <= stmin or stp >= stmax)) or infoc == 0):
+                info = 6
+            if (stp == stpmax and f <= ftest1 and dg <= dgtest):
+                info = 5
+            if (stp == stpmin and (f > ftest1 or dg >= dgtest)):
+                info = 4
+            if (nfev >= maxfev):
+                info = 3
+            if (brackt and stmax-stmin <= xtol*stmax):
+                info = 2
+            if (f <= ftest1 and abs(dg) <= gtol*(-dginit)):
+                info = 1
 
-            # Reset the function and gradient values for f.
-            fx = fxm + stx*dgtest
-            fy = fym + sty*dgtest
-            dgx = dgxm + dgtest
-            dgy = dgym + dgtest
-        else:
-            # Call cstep to update the interval of uncertainty 
-            # and to compute the new step.
-            stx,fx,dgx,sty,fy,dgy,stp,f,dg,brackt,infoc = \
-                cstep(stx,fx,dgx,sty,fy,dgy,stp,f,dg, brackt,stmin,stmax)
+            # Check for termination.
+            if (info != 0):
+                if out is None:
+                    return x.copy(), f, g, stp, info, nfev
+                np.copyto(out, x)
+                return out, f, g, stp, info, nfev
 
-        # Force a sufficient decrease in the size of the
-        # interval of uncertainty.
-        if (brackt):
-            if (abs(sty-stx) >= p66*width1):
-                stp = stx + p5*(sty - stx)
-            width1 = width
-            width = abs(sty-stx)
+            # In the first stage we seek a step for which the modified
+            # function has a nonpositive value and nonnegative derivative.
+            if (stage1 and f <= ftest1 and dg >= min(ftol,gtol)*dginit):
+                stage1 = 0
+
+            # A modified function is used to predict the step only if
+            # we have not obtained a step for which the modified
+            # function has a nonpositive function value and nonnegative 
+            # derivative, and if a lower function value has been  
+            # obtained but the decrease is not sufficient.
+            if (stage1 and f <= fx and f > ftest1):
+                # Define the modified function and derivative values.
+                fm = f - stp*dgtest
+                fxm = fx - stx*dgtest
+                fym = fy - sty*dgtest
+                dgm = dg - dgtest
+                dgxm = dgx - dgtest
+                dgym = dgy - dgtest
 
+                # Call cstep to update the interval of uncertainty 
+                # and to compute the new step.
+                stx, fxm, dgxm, sty, fym, dgym, stp, fm, dgm, brackt, infoc = \
+                    cstep(stx,fxm,dgxm,sty,fym,dgym,stp,fm,dgm, brackt,stmin,stmax)
+
+                # Reset the function and gradient values for f.
+                fx = fxm + stx*dgtest
+                fy = fym + sty*dgtest
+                dgx = dgxm + dgtest
+                dgy = dgym + dgtest
+            else:
+                # Call cstep to update the interval of uncertainty 
+                # and to compute the new step.
+                stx,fx,dgx,sty,fy,dgy,stp,f,dg,brackt,infoc = \
+                    cstep(stx,fx,dgx,sty,fy,dgy,stp,f,dg, brackt,stmin,stmax)
 
+            # Force a sufficient decrease in the size of the
+            # interval of uncertainty.
+            if (brackt):
+                if (abs(sty-stx) >= p66*width1):
+                    stp = stx + p5*(sty - stx)
+                width1 = width
+                width = abs(sty-stx)
 
 
 # function  [stx,fx,dx,sty,fy,dy,stp,fp,dp,brackt,info] ...
@@ -148,7 +186,7 @@ def cstep(stx, fx, dx, sty, fy, dy, stp, fp, dp, brackt, stpmin, stpmax):
         info = 1
         bound = 1
         theta = 3*(fx - fp)/(stp - stx) + dx + dp
-        s = np.linalg.norm([theta,dx,dp],np.inf)
+        s = max(abs(theta),abs(dx),abs(dp))
         gamma = s*math.sqrt((theta/s)**2 - (dx/s)*(dp/s))
         if (stp < stx):
             gamma = -gamma
@@ -171,7 +209,7 @@ def cstep(stx, fx, dx, sty, fy, dy, stp, fp, dp, brackt, stpmin, stpmax):
         info = 2
         bound = 0
         theta = 3*(fx - fp)/(stp - stx) + dx + dp
-        s = np.linalg.norm([theta,dx,dp],np.inf)
+        s = max(abs(theta),abs(dx),abs(dp))
         gamma = s*math.sqrt((theta/s)**2 - (dx/s)*(dp/s))
         if (stp > stx):
             gamma = -gamma
@@ -198,7 +236,7 @@ def cstep(stx, fx, dx, sty, fy, dy, stp, fp, dp, brackt, stpmin, stpmax):
         info = 3
         bound = 1
         theta = 3*(fx - fp)/(stp - stx) + dx + dp
-        s = np.linalg.norm([theta,dx,dp],np.inf)
+        s = max(abs(theta),abs(dx),abs(dp))
 
         # The case gamma = 0 only arises if the cubic does not tend
         # to infinity in the direction of the step.
@@ -235,7 +273,7 @@ def cstep(stx, fx, dx, sty, fy, dy, stp, fp, dp, brackt, stpmin, stpmax):
         bound = 0
         if (brackt):
             theta = 3*(fp - fy)/(sty - stp) + dy + dp
-            s = np.linalg.norm([theta,dy,dp],np.inf)
+            s = max(abs(theta),abs(dy),abs(dp))
             gamma = s*math.sqrt((theta/s)**2 - (dy/s)*(dp/s))
             if (stp > sty):
                 gamma = -gamma
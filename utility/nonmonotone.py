@@ -0,0 +1,94 @@
+"""
+Reference values for nonmonotone acceptance tests.
+
+A history object receives the function value of every accepted iterate
+through `push` and provides the reference value used in the acceptance
+test through `reference`. The available rules are:
+  * MaxHistory: maximum of the last M values (the default rule; the
+    method is monotone until M values have been pushed).
+  * AdaptiveMaxHistory: like MaxHistory, but the window length grows
+    by one per iterate and is halved whenever the objective increases.
+  * ZhangHagerHistory: weighted average of all values as proposed by
+    Zhang and Hager (SIAM J. Optim. 14, 2004).
+"""
+from collections import deque
+from . import parameters
+
+
+class MaxHistory:
+    """
+    Maximum of the last M values, using a monotone deque (O(1) amortized).
+    Values which left the window are dropped on push, so the first
+    candidate is the maximum. The start of the window never moves back,
+    also for the adaptive window.
+    """
+    def __init__(self, M):
+        self.M = M
+        self.count = 0
+        self.last = None
+        self.candidates = deque()  # (index, value) with decreasing values
+
+    def push(self, fx):
+        """Append the function value of a new iterate."""
+        while self.candidates and self.candidates[-1][1] <= fx:
+            self.candidates.pop()
+        self.candidates.append((self.count, fx))
+        self.count += 1
+        self.last = fx
+        while self.candidates[0][0] < self.count - self.window():
+            self.candidates.popleft()
+
+    def window(self):
+        """Current window length."""
+        return self.M
+
+    def reference(self):
+        """Reference value for the next acceptance test."""
+        if self.count < self.window():
+            return self.last
+        return self.candidates[0][1]
+
+
+class AdaptiveMaxHistory(MaxHistory):
+    """Maximum over an adaptive window of at most mMax and at least mMin values."""
+    def __init__(self, mMax, mMin=1):
+        super().__init__(mMax)
+        self.mMin = mMin
+        self.length = mMin
+
+    def push(self, fx):
+        if self.last is not None and fx > self.last:
+            self.length = max(self.mMin, self.length // 2)
+        elif self.last is not None:
+            self.length = min(self.M, self.length + 1)
+        super().push(fx)
+
+    def window(self):
+        return self.length
+
+
+class ZhangHagerHistory:
+    """Zhang-Hager average C = (eta*Q*C + fx) / (eta*Q + 1)."""
+    def __init__(self, eta):
+        self.eta = eta
+        self.C = None
+        self.Q = 0
+
+    def push(self, fx):
+        Q = self.eta * self.Q + 1
+        self.C = fx if self.C is None else (self.eta * self.Q * self.C + fx) / Q
+        self.Q = Q
+
+    def reference(self):
+        return self.C
+
+
+def default():
+    """History for the rule selected in the parameters file."""
+    if parameters.nonmonRule == 'max':
+        return MaxHistory(parameters.nonmon)
+    if parameters.nonmonRule == 'adaptive':
+        return AdaptiveMaxHistory(parameters.nonmon)
+    if parameters.nonmonRule == 'zhangHager':
+        return ZhangHagerHistory(parameters.zhangHagerEta)
+    raise ValueError(f"Unknown nonmonotone rule: {parameters.nonmonRule}")
@@ -0,0 +1,156 @@
+"""
+Objective function oracles used by all implemented methods.
+
+An oracle bundles the function value, the gradient and (if available) a
+fused evaluation of both at the same point, and counts how often each
+quantity was requested. The algorithms use the fused evaluation whenever
+both quantities are known to be needed at one point. The trial points of
+the regularization methods are an exception: their gradient is only needed
+if the point is accepted, so by default they are evaluated with f alone and
+the gradient of an accepted point is evaluated afterwards. For oracles whose
+gradient costs little on top of the value (e.g., the fused pycutest or
+NumPy evaluations), fusedTrial=True evaluates every trial point with the
+fused evaluation instead, wasting the gradient of rejected points but
+saving the second call at accepted ones. The time spent in the
+evaluations is only accumulated once timing was enabled (by the caller or
+a tracer), so untimed oracles do not pay for the clock.
+
+Optionally, the evaluations can be memoized in an EvaluationCache which
+may be shared by several oracles for the same problem (e.g., by all
+algorithms started at the same point). The counters of each oracle still
+report the logical number of evaluations, regardless of cache hits.
+Cached gradients are shared between callers and must not be modified.
+"""
+import time
+from collections import OrderedDict
+
+
+class EvaluationCache:
+    """Bounded LRU cache of function values and gradients keyed on the bytes of x."""
+    def __init__(self, size=64):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def entry(self, x):
+        """Return the [value, gradient] entry for x, creating an empty one if needed."""
+        key = x.tobytes()
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [None, None]
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return entry
+
+    def count(self, hit):
+        """Record a cache hit or miss."""
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+
+class Oracle:
+    """
+    Objective function oracle.
+
+    f : function returning the objective value at x.
+    Df : function returning the gradient at x.
+    fDf : optional function returning (f(x), Df(x)) in one evaluation.
+    cache : optional EvaluationCache used to memoize evaluations.
+    timed : whether to accumulate the time spent in evaluations in `time`.
+    fusedTrial : whether trial points are evaluated with value and gradient at once.
+    """
+    def __init__(self, f, Df, fDf=None, cache=None, timed=False, fusedTrial=False):
+        self.f = f
+        self.Df = Df
+        self.fDf = fDf
+        self.cache = cache
+        self.fusedTrial = fusedTrial
+        self.nValue = 0
+        self.nGradient = 0
+        self.nFused = 0
+        self.time = 0.0
+        self.timed = False
+        if timed:
+            self.enableTiming()
+
+    def enableTiming(self):
+        """Accumulate the time spent in evaluations (from now on) in `time`."""
+        if not self.timed:
+            self.f, self.Df = self.timing(self.f), self.timing(self.Df)
+            if self.fDf is not None:
+                self.fDf = self.timing(self.fDf)
+            self.timed = True
+
+    def timing(self, fun):
+        """fun with its run time added to `time`."""
+        def timedFun(x):
+            tic = time.perf_counter()
+            try:
+                return fun(x)
+            finally:
+                self.time += time.perf_counter() - tic
+        return timedFun
+
+    def value(self, x):
+        """Objective value at x."""
+        self.nValue += 1
+        if self.cache is None:
+            fx = self.f(x)
+        else:
+            entry = self.cache.entry(x)
+            self.cache.count(entry[0] is not None)
+            if entry[0] is None:
+                entry[0] = self.f(x)
+            fx = entry[0]
+        return fx
+
+    def gradient(self, x):
+        """Gradient at x."""
+        self.nGradient += 1
+        if self.cache is None:
+            gx = self.Df(x)
+        else:
+            entry = self.cache.entry(x)
+            self.cache.count(entry[1] is not None)
+            if entry[1] is None:
+                entry[1] = self.Df(x)
+            gx = entry[1]
+        return gx
+
+    def valueAndGradient(self, x):
+        """Objective value and gradient at x."""
+        self.nValue += 1
+        self.nGradient += 1
+        if self.cache is None:
+            fx, gx = self.evaluate(x)
+        else:
+            entry = self.cache.entry(x)
+            self.cache.count(entry[0] is not None and entry[1] is not None)
+            if entry[0] is None and entry[1] is None:
+                entry[:] = self.evaluate(x)
+            elif entry[0] is None:
+                entry[0] = self.f(x)
+            elif entry[1] is None:
+                entry[1] = self.Df(x)
+            fx, gx = entry
+        return fx, gx
+
+    def evaluate(self, x):
+        """Evaluate value and gradient, using the fused evaluation if available."""
+        if self.fDf is None:
+            return self.f(x), self.Df(x)
+        self.nFused += 1
+        return self.fDf(x)
+
+
+def fromPycutest(pycutestProb, cache=None, timed=False, fusedTrial=False):
+    """Oracle for an (unconstrained) pycutest problem."""
+    return Oracle(pycutestProb.obj,
+        lambda x: pycutestProb.lagjac(x)[0],
+        lambda x: pycutestProb.obj(x, gradient=True),
+        cache, timed, fusedTrial)
@@ -18,5 +18,16 @@ crvThreshold = 1e-8
 # Limited memory bound
 memory = 5
 
+# Storage precision of the limited memory pairs: 'float64' or 'float32'
+# (products, Gram matrices and solves are always computed in float64)
+lmDtype = 'float64'
+
+# Scratch directory for memory-mapped limited memory pairs (None keeps them in RAM)
+lmScratch = None
+
 # Nonmonotonicity bound
 nonmon = 8
+
+# Nonmonotone reference value: 'max', 'adaptive' or 'zhangHager'
+nonmonRule = 'max'
+zhangHagerEta = 0.85
@@ -3,6 +3,10 @@ Python module for performance profiles. The code is based on
 `perfprof` from the MATLAB Guide by D. J. Higham and N. J. Higham:
 https://github.com/higham/matlab-guide-3ed/blob/master/perfprof.m
 
+The profile computation (`staircases`) only needs NumPy. matplotlib is
+imported when a profile is plotted (`perfprof`), and `pyplot(headless=True)`
+selects the Agg backend for rendering without a display.
+
     References
     ----------
     [1] E. D. Dolan, and J. J. More,
@@ -10,14 +14,23 @@ https://github.com/higham/matlab-guide-3ed/blob/master/perfprof.m
         Math. Programming, 91:201-213, 2002.
 """
 
-__all__ = ['perfprof']
+__all__ = ['perfprof', 'staircases', 'pyplot']
 
 import numpy as np
-import matplotlib.pyplot as plt
+
+
+def pyplot(headless=False):
+    """Import matplotlib.pyplot, using the Agg backend if headless."""
+    import matplotlib
+    if headless:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
 
 
 def thetaMax(data, minvals):
     """
+    Largest finite performance ratio (at least 1.01).
     """
     assert np.all(minvals > 0)
     tmax = np.max(data, axis=1, initial=0, where=(data < np.inf))
@@ -25,41 +38,64 @@ def thetaMax(data, minvals):
     return thmax
 
 
-def theta(col, minvals):
+def staircases(data, thmax=None, tol=np.sqrt(np.finfo(np.double).eps)):
     """
-    Performance ratios for an individual solver against the vector of minimum values.
-    Problems that are not solved by any algorithm have their ratios set to Inf.
-    """
-    assert np.all(minvals > 0)
-    th = np.full(np.shape(col), np.inf)
-    valid = (minvals < np.inf)
-    th[valid] = col[valid] / minvals[valid]
-    return th
+    Staircase (theta, prob) arrays of the performance profiles of all
+    solvers, computed with a single sort of the performance ratios.
 
+    data : M-by-N matrix of measurements (see `perfprof`).
+    thmax : maximum value of theta (see `perfprof`).
+    tol : tolerance for endpoint clamping.
 
-def makeStaircase(col, m, thmax, tol):
-    """
-    Assemble staircase (x, y) pairs.
-    col : "column" of theta values
-    m : number of problems
-    thmax : maximum value of theta for endpoint clamping
-    tol : theta tolerance for endpoint clamping
+    Returns thmax and a list with a (theta, prob) pair for each solver, or
+    None for solvers which do not solve any problem within thmax.
     """
-    theta, counts = np.unique(col, return_counts=True)
-    prob = np.cumsum(counts) / m
+    data = np.asarray(data).astype(np.double)
+    m, n = data.shape  # `m` problems, `n` solvers
 
-    # Ensure endpoints plotted correctly
-    if theta[0] >= 1 + tol:
-        theta = np.append(1, theta)
-        prob = np.append(0, prob)
-    if theta[-1] < thmax - tol:
-        theta = np.append(theta, thmax)
-        prob = np.append(prob, prob[-1])
+    # Row-wise minima. NaN values are treated like +infinity.
+    minvals = np.min(data, axis=1, initial=np.inf, where=~np.isnan(data))
 
-    return theta, prob
+    if np.any(minvals <= 0):
+        raise ValueError("Data contains non-positive performance measurements")
+
+    if thmax is None:
+        thmax = thetaMax(data, minvals)
+
+    # Performance ratios. Problems that are not solved by any algorithm,
+    # NaN values and ratios beyond thmax are set to Inf.
+    ratios = np.full(data.shape, np.inf)
+    valid = (minvals < np.inf)
+    ratios[valid] = data[valid] / minvals[valid, None]
+    ratios[~(ratios <= thmax)] = np.inf
+    ratios.sort(axis=0)
+
+    # Each profile jumps at the last occurrence of every finite ratio
+    last = np.isfinite(ratios)
+    last[:-1] &= (ratios[:-1] != ratios[1:])
+    fraction = np.arange(1, m + 1) / m
+
+    curves = []
+    for solver in range(n):
+        theta = ratios[last[:, solver], solver]
+        prob = fraction[last[:, solver]]
+        if len(theta) == 0:
+            curves.append(None)
+            continue
 
+        # Ensure endpoints plotted correctly
+        if theta[0] >= 1 + tol:
+            theta = np.append(1, theta)
+            prob = np.append(0, prob)
+        if theta[-1] < thmax - tol:
+            theta = np.append(theta, thmax)
+            prob = np.append(prob, prob[-1])
+        curves.append((theta, prob))
 
-def perfprof(data, linestyle, thmax = None, tol = np.sqrt(np.finfo(np.double).eps), **kwargs):
+    return thmax, curves
+
+
+def perfprof(data, linestyle, thmax = None, tol = np.sqrt(np.finfo(np.double).eps), curves = None, **kwargs):
     """
     Peformance profile for the input data.
 
@@ -68,7 +104,7 @@ def perfprof(data, linestyle, thmax = None, tol = np.sqrt(np.finfo(np.double).ep
     data : Array of timings/errors to plot.
            M-by-N matrix where data[i, j] > 0 measures the performance of the
            j-th solver on the i-th problem, with smaller values denoting "better".
-    
+
     linestyle : List of line specs, e.g., ['o-r', '-.g']
 
     thmax : Maximum value of theta shown on the x-axis.
@@ -77,44 +113,36 @@ def perfprof(data, linestyle, thmax = None, tol = np.sqrt(np.finfo(np.double).ep
     tol : Tolerance for endpoint clamping.
           Defaults to sqrt(eps), where eps is the double precision machine accuracy.
 
+    curves : Staircases of the data as returned by `staircases` (with thmax),
+             if already computed.
+
     **kwargs : Optional keyword args to be forwarded to matplotlib.
-    
+
     Returns
     -------
     thmax : Maximum value of theta shown on the x-axis, as
             supplied by the user or computed by the function.
-    
+
     h : array of Line2D handles of the individual plot lines.
     """
 
-    data = np.asarray(data).astype(np.double)
-    m, n = data.shape  # `m` problems, `n` solvers
+    n = np.shape(data)[1]  # `n` solvers
 
     # Check input
     if len(linestyle) < n:
         raise ValueError("Number of line specs < number of solvers")
 
-    # Row-wise minima. NaN values are treated like +infinity.
-    minvals = np.min(data, axis=1, initial=np.inf, where=~np.isnan(data))
-
-    if np.any(minvals <= 0):
-        raise ValueError("Data contains non-positive performance measurements")
-
-    if thmax is None:
-        thmax = thetaMax(data, minvals)
+    if curves is None:
+        thmax, curves = staircases(data, thmax, tol)
 
+    plt = pyplot()
     h = [None] * n
-    for solver in range(n):  # for each solver
-        col = theta(data[:, solver], minvals)  # performance ratio
-        col = col[col <= thmax] # crop and remove infs/NaNs
-
-        if len(col) == 0:
+    for solver, curve in enumerate(curves):
+        if curve is None:
             continue
 
-        th, prob = makeStaircase(col, m, thmax, tol)
-
         # plot current line and disable frame clipping (to support y-intercept marking)
-        h[solver] = plt.step(th, prob, linestyle[solver], where='post', **kwargs)
+        h[solver] = plt.step(*curve, linestyle[solver], where='post', **kwargs)
         h[solver][0].set_clip_on(False)
 
     # set axis limits
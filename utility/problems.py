@@ -0,0 +1,80 @@
+"""
+The CUTEst problems used in the benchmark.
+
+The problems are built once by prepareProblems.py into a persistent
+pycutest cache, together with a manifest recording the dimension and
+build status of every problem. The benchmark only loads prebuilt problems.
+"""
+import json
+import os
+
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+cacheDirectory = os.path.join(root, 'pycutest_cache_holder')
+manifestPath = os.path.join(cacheDirectory, 'manifest.json')
+
+
+def problemsToRun():
+    """Names of the problems to solve (in a fixed order)."""
+    # General list of eligible problems
+    problems = 'ARWHEAD', 'BA-L16LS', 'BA-L21LS', 'BA-L49LS', 'BA-L52LS', \
+        'BA-L73LS', 'BDQRTIC', 'BOX', 'BOXPOWER', 'BROYDN3DLS', 'BROYDN7D', \
+        'BROYDNBDLS', 'BRYBND', 'CHAINWOO', 'COSINE', 'CRAGGLVY', 'CURLY10', \
+        'CURLY20', 'CURLY30', 'DIXMAANA', 'DIXMAANB', 'DIXMAANC', 'DIXMAAND', \
+        'DIXMAANE', 'DIXMAANF', 'DIXMAANG', 'DIXMAANH', 'DIXMAANI', 'DIXMAANJ', \
+        'DIXMAANK', 'DIXMAANL', 'DIXMAANM', 'DIXMAANN', 'DIXMAANO', 'DIXMAANP', \
+        'DIXON3DQ', 'DQDRTIC', 'DQRTIC', 'EDENSCH', 'EG2', 'EIGENALS', 'EIGENBLS', \
+        'EIGENCLS', 'ENGVAL1', 'EXTROSNB', 'FLETBV3M', 'FLETCBV2', 'FLETCBV3', \
+        'FLETCHBV', 'FLETCHCR', 'FMINSRF2', 'FMINSURF', 'FREUROTH', 'GENHUMPS', \
+        'INDEF', 'INDEFM', 'JIMACK', 'LIARWHD', 'MODBEALE', 'MOREBV', 'MSQRTALS', \
+        'MSQRTBLS', 'NCB20', 'NCB20B', 'NONCVXU2', 'NONCVXUN', 'NONDIA', 'NONDQUAR', \
+        'NONMSQRT', 'OSCIGRAD', 'PENALTY1', 'POWELLSG', 'POWER', 'QUARTC', 'SBRYBND', \
+        'SCHMVETT', 'SCOSINE', 'SCURLY10', 'SCURLY20', 'SCURLY30', 'SINQUAD', \
+        'SPARSINE', 'SPARSQUR', 'SPMSRTLS', 'SROSENBR', 'SSBRYBND', 'SSCOSINE', \
+        'TESTQUAD', 'TOINTGSS', 'TQUARTIC', 'TRIDIA', 'WOODS', 'YATP1LS', 'YATP2LS'
+
+    # Fast problems
+    #problems = 'ARWHEAD', 'BDQRTIC', 'BOXPOWER', 'BROYDN3DLS', 'BROYDNBDLS', \
+    #    'BRYBND', 'COSINE', 'CRAGGLVY', 'DIXMAANA', 'DIXMAANB', 'DIXMAANC', \
+    #    'DIXMAAND','DIXMAANE','DIXMAANF','DIXMAANG','DIXMAANH', 'DIXMAANI', \
+    #    'DIXMAANJ','DIXMAANK','DIXMAANL','DIXMAANM','DIXMAANN', 'DIXMAANO', \
+    #    'DIXMAANP','DIXON3DQ','DQDRTIC','DQRTIC','EDENSCH', 'EG2', 'ENGVAL1', \
+    #    'FLETBV3M','FLETCBV2','FMINSRF2','FMINSURF', 'FREUROTH','LIARWHD', \
+    #    'MOREBV','NONDIA','NONDQUAR', 'PENALTY1','POWELLSG','QUARTC','SCHMVETT', \
+    #    'SINQUAD', 'SPARSQUR','SROSENBR','TOINTGSS','TQUARTIC', 'WOODS'
+
+    # List of problems that can be excluded because either:
+    #  * the initial point is already stationary (FLETCBV2)
+    #  * all algorithms are known to fail (the rest)
+    exclude = 'BA-L16LS', 'BA-L21LS', 'BA-L49LS', 'BA-L52LS', 'BA-L73LS', \
+        'CURLY30', 'FLETCBV2', 'FLETCBV3', 'FLETCHBV', 'INDEF', 'NONMSQRT', \
+        'SBRYBND', 'SCOSINE', 'SCURLY10', 'SCURLY20', 'SCURLY30', 'SSCOSINE'
+
+    # Use list comprehension to maintain order
+    return [p for p in problems if p not in exclude]
+
+
+def useCache():
+    """Use the persistent cache (must be called before pycutest is imported)."""
+    os.environ.setdefault('PYCUTEST_CACHE', cacheDirectory)
+
+
+def loadManifest():
+    """Manifest mapping problem names to their build status and dimension."""
+    if not os.path.exists(manifestPath):
+        return {}
+    with open(manifestPath) as file:
+        return json.load(file)
+
+
+def writeManifest(manifest):
+    """Atomically replace the manifest."""
+    with open(manifestPath + '.tmp', 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(manifestPath + '.tmp', manifestPath)
+
+
+def missingProblems(problems):
+    """Problems which have not been built successfully."""
+    manifest = loadManifest()
+    return [p for p in problems if manifest.get(p, {}).get('status') != 'ok']
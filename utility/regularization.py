@@ -2,113 +2,275 @@
 This file contains generic algorithm prototypes for monotone and
 nonmonotone limited-memory regularization methods. The behaviour of
 the functions can be controlled through the following parameters:
-  * lmData: a structure containing limited memory data. This
-    object does not need to follow any particular interface.
+  * lmData: a structure containing limited memory data. Apart from
+    the workspace of n-sized buffers (lmData.workspace, see
+    utility.workspace), it does not need to follow any particular
+    interface.
   * updateCalculator: a function updating the lmData object in
     case of a successful step.
   * directionCalculator: a function calculating the search
     direction based on the contents of lmData
+  * oracle: an oracle.Oracle providing the objective function
+    and its gradient
+  * tracer: an optional utility.trace.Tracer recording every
+    iteration and rejected trial step
+
+The batched variant advances K independent instances at once. There,
+the calculators act on all instances simultaneously and the objective
+is given by a vectorized oracle F(X) -> (f, G) which evaluates the rows
+of X (shape (K, n)) and returns the values f (K,) and gradients G (K, n).
 """
 import numpy as np
-from . import parameters, morethuente
+from . import parameters, morethuente, nonmonotone
+from .oracle import Oracle
 
 
-def genericMonotone(lmData, updateCalculator, directionCalculator, f, Df, x):
+def genericMonotone(lmData, updateCalculator, directionCalculator, oracle, x, tracer=None):
     """Generic monotone regularization method."""
     iter = np.array([0, 1])
-    fx, gx, mu = f(x), Df(x), 1
+    (fx, gx), mu = oracle.valueAndGradient(x), 1
 
     if stoppingTest(iter, mu, gx):
         return [x, iter]
     
-    fun = lambda x: (f(x), Df(x))
+    if tracer is not None:
+        tracer.begin(oracle)
     d = -gx / np.linalg.norm(gx)
+    if tracer is not None:
+        tracer.endDirection()
     xn,fn,gn,t,exls,it = \
-        morethuente.cvsrch(fun,len(x),x,fx,gx,d,1,1e-4,0.9,1e-16,1e-20,1e20,20)
+        initialLineSearch(len(x))(oracle,x,fx,gx,d,1)
     
     iter += [1, it]
+    if tracer is not None:
+        tracer.record(iter, fn, gn, np.nan, t * d, np.nan, fx - fn, exls == 1)
     if exls != 1:  # line search failed
         return [x, iter]
     
     updateCalculator(lmData, t * d, gn - gx)
     x, fx, gx = xn, fn, gn
 
+    ws = lmData.workspace
     while not stoppingTest(iter, mu, gx):
+        if tracer is not None:
+            tracer.begin(oracle)
         d = directionCalculator(lmData, mu, gx)
+        if tracer is not None:
+            tracer.endDirection()
         pred = 0.5*mu*np.dot(d, d)-0.5*np.dot(gx, d)
+        muTrial = mu
 
         # Check whether predicted reduction is sufficient
         if not pred >= 1e-4*np.linalg.norm(gx)*np.linalg.norm(d):
             mu *= 4
+            if tracer is not None:
+                tracer.record(iter, fx, gx, muTrial, d, pred, np.nan, False)
             continue
 
         # Compute trial point and actual reduction
-        xtry, ftry, ared = computeTrialPoint(x, f, fx, d)
+        xtry, ftry, gtry, ared = computeTrialPoint(x, oracle, fx, d, ws('xtry'))
 
         # Check whether iteration was successful
         if (ared <= 1e-4*pred):
             mu *= 4
             iter += [0, 1]
         else:
-            x, fx, gx, yn = acceptTrialPoint(xtry, ftry, Df, gx)
+            x, fx, gx, yn = acceptTrialPoint(xtry, ftry, gtry, oracle, gx, ws('y'))
+            ws.swap('x', 'xtry')
             updateCalculator(lmData, d, yn)
             if (ared >= 0.9*pred):
                 mu = max(1e-4, 0.5*mu)
             iter += [1, 1]
 
+        if tracer is not None:
+            tracer.record(iter, fx, gx, muTrial, d, pred, ared, ared > 1e-4*pred)
+
     return [x, iter]
 
 
-def genericNonmonotone(lmData, updateCalculator, directionCalculator, f, Df, x):
-    """Generic nonmonotone regularization method."""
+def genericNonmonotone(lmData, updateCalculator, directionCalculator, oracle, x, history=None, tracer=None):
+    """
+    Generic nonmonotone regularization method. The reference values are
+    provided by history (see utility.nonmonotone).
+    """
     iter = np.array([0, 1])
-    fx, gx, mu = f(x), Df(x), 1
-    fxList = np.append(np.zeros(parameters.nonmon-1), fx)
+    (fx, gx), mu = oracle.valueAndGradient(x), 1
+    history = nonmonotone.default() if history is None else history
+    history.push(fx)
 
     if stoppingTest(iter, mu, gx):
         return [x, iter]
     
-    fun = lambda x: (f(x), Df(x))
+    if tracer is not None:
+        tracer.begin(oracle)
     d = -gx / np.linalg.norm(gx)
+    if tracer is not None:
+        tracer.endDirection()
     xn,fn,gn,t,exls,it = \
-        morethuente.cvsrch(fun,len(x),x,fx,gx,d,1,1e-4,0.9,1e-16,1e-20,1e20,20)
+        initialLineSearch(len(x))(oracle,x,fx,gx,d,1)
     
     iter += [1, it]
+    if tracer is not None:
+        tracer.record(iter, fn, gn, np.nan, t * d, np.nan, fx - fn, exls == 1)
     if exls != 1:  # line search failed
         return [x, iter]
     
     updateCalculator(lmData, t * d, gn - gx)
     x, fx, gx = xn, fn, gn
-    fxList = np.append(fxList[1:], fx)
+    history.push(fx)
 
+    ws = lmData.workspace
     while not stoppingTest(iter, mu, gx):
+        if tracer is not None:
+            tracer.begin(oracle)
         d = directionCalculator(lmData, mu, gx)
+        if tracer is not None:
+            tracer.endDirection()
         pred = 0.5*mu*np.dot(d, d)-0.5*np.dot(gx, d)
+        muTrial = mu
 
         # Check whether predicted reduction is sufficient
         if not pred >= 1e-4*np.linalg.norm(gx)*np.linalg.norm(d):
             mu *= 4
+            if tracer is not None:
+                tracer.record(iter, fx, gx, muTrial, d, pred, np.nan, False)
             continue
 
         # Compute trial point and actual reduction
-        fxRef = fx if iter[0]+1 < parameters.nonmon else max(fxList)
-        xtry, ftry, ared = computeTrialPoint(x, f, fxRef, d)
+        xtry, ftry, gtry, ared = computeTrialPoint(x, oracle, history.reference(), d, ws('xtry'))
 
         # Check whether iteration was successful
         if (ared <= 1e-4*pred):
             mu *= 4
             iter += [0, 1]
         else:
-            x, fx, gx, yn = acceptTrialPoint(xtry, ftry, Df, gx)
-            fxList = np.append(fxList[1:], fx)
+            x, fx, gx, yn = acceptTrialPoint(xtry, ftry, gtry, oracle, gx, ws('y'))
+            ws.swap('x', 'xtry')
+            history.push(fx)
             updateCalculator(lmData, d, yn)
             if (ared >= 0.9*pred):
                 mu = max(1e-4, 0.5*mu)
             iter += [1, 1]
 
+        if tracer is not None:
+            tracer.record(iter, fx, gx, muTrial, d, pred, ared, ared > 1e-4*pred)
+
     return [x, iter]
 
 
+def genericBatch(lmData, updateCalculator, directionCalculator, F, X, histories=None):
+    """
+    Generic regularization method for a batch of instances. The method is
+    monotone if histories is None; otherwise, histories holds one history
+    object per instance (see utility.nonmonotone) providing the reference
+    values of the nonmonotone rule as in genericNonmonotone. The direction
+    calculator receives the indices of the active instances as its last
+    argument. Returns the final iterates and the iteration counts of every
+    instance.
+    """
+    X = np.array(X, dtype=float)
+    K = X.shape[0]
+    iters = np.zeros((K, 2), dtype=int)
+    iters[:, 1] = 1
+    (fx, G), mu = F(X), np.ones(K)
+    if histories is not None:
+        for history, f in zip(histories, fx):
+            history.push(f)
+
+    # The initial line search is performed separately for every instance
+    done = stoppingTestBatch(iters, mu, G)
+    Sn, Yn = np.zeros_like(X), np.zeros_like(X)
+    lineSearch = initialLineSearch(X.shape[1])
+    for k in np.flatnonzero(~done):
+        d = -G[k] / np.linalg.norm(G[k])
+        xn,fn,gn,t,exls,it = lineSearch(rowOracle(F),X[k],fx[k],G[k],d,1)
+        iters[k] += [1, it]
+        if exls != 1:  # line search failed
+            done[k] = True
+            continue
+        Sn[k], Yn[k] = t * d, gn - G[k]
+        X[k], fx[k], G[k] = xn, fn, gn
+    updateCalculator(lmData, ~done, Sn, Yn)
+    if histories is not None:
+        for k in np.flatnonzero(~done):
+            histories[k].push(fx[k])
+
+    active = ~done & ~stoppingTestBatch(iters, mu, G)
+    D = np.zeros_like(X)
+    while np.any(active):
+        # Directions of the active instances only (D is zero for the others)
+        rows = np.flatnonzero(active)
+        D[~active] = 0
+        D[rows] = directionCalculator(lmData, mu[rows], G[rows], rows)
+        DtD, GtD = np.sum(D * D, axis=1), np.sum(G * D, axis=1)
+        pred = 0.5*mu*DtD - 0.5*GtD
+
+        # Check whether predicted reduction is sufficient
+        sufficient = pred >= 1e-4*np.linalg.norm(G, axis=1)*np.sqrt(DtD)
+        mu[active & ~sufficient] *= 4
+        trial = np.flatnonzero(active & sufficient)
+        if trial.size == 0:
+            # No trial point to evaluate (F is not called with an empty batch)
+            active &= ~stoppingTestBatch(iters, mu, G)
+            continue
+
+        # Compute trial points and actual reductions
+        fxRef = fx[trial] if histories is None else \
+            np.array([histories[k].reference() for k in trial], dtype=float)
+        Xtry = X[trial] + D[trial]
+        ftry, Gtry = F(Xtry)
+        ared = fxRef - ftry
+
+        # Check whether iterations were successful
+        success = ared > 1e-4*pred[trial]
+        rejected, accepted = trial[~success], trial[success]
+        mu[rejected] *= 4
+        iters[rejected] += [0, 1]
+
+        mask = np.zeros(K, dtype=bool)
+        mask[accepted] = True
+        Sn[accepted], Yn[accepted] = D[accepted], Gtry[success] - G[accepted]
+        X[accepted], fx[accepted], G[accepted] = Xtry[success], ftry[success], Gtry[success]
+        if histories is not None:
+            for k in accepted:
+                histories[k].push(fx[k])
+        updateCalculator(lmData, mask, Sn, Yn)
+        veryGood = accepted[ared[success] >= 0.9*pred[accepted]]
+        mu[veryGood] = np.maximum(1e-4, 0.5*mu[veryGood])
+        iters[accepted] += [1, 1]
+
+        active &= ~stoppingTestBatch(iters, mu, G)
+
+    return [X, iters]
+
+
+def initialLineSearch(n):
+    """More-Thuente line search used for the first step of all methods."""
+    return morethuente.LineSearch(n, 1e-4, 0.9, 1e-16, 1e-20, 1e20, 20)
+
+
+def rowOracle(F):
+    """
+    Oracle for a single instance of the vectorized oracle F. The value and
+    gradient at the last point are kept, so F is called once per point.
+    """
+    last = [None, None]
+    def fDf(x):
+        if last[0] is None or not np.array_equal(last[0], x):
+            f, G = F(x[None, :])
+            last[:] = x.copy(), (f[0], G[0])
+        return last[1]
+    return Oracle(lambda x: fDf(x)[0], lambda x: fDf(x)[1], fDf)
+
+
+def stoppingTestBatch(iters, mu, G):
+    """Stopping test of every instance of a batch."""
+    return (iters[:, 0] >= parameters.maxIter) \
+        | (iters[:, 1] >= parameters.maxEval) \
+        | (mu > parameters.maxReg) \
+        | (np.linalg.norm(G, np.inf, axis=1) <= parameters.tolGrad)
+
+
 def stoppingTest(iter, mu, gx):
     """Generic stopping test used for all regularization algorithms."""
     return iter[0] >= parameters.maxIter \
@@ -118,14 +280,23 @@ def stoppingTest(iter, mu, gx):
         #or np.linalg.norm(gx) <= parameters.tolGrad * max(1, np.linalg.norm(x))
 
 
-def computeTrialPoint(x, f, fx, d):
-    """Compute trial point, function value, and reduction."""
-    xtry = x + d
-    ftry = f(xtry)
-    return xtry, ftry, fx - ftry
+def computeTrialPoint(x, oracle, fx, d, out=None):
+    """
+    Compute trial point (into out if given), function value, gradient (None
+    unless the oracle evaluates trial points fused), and reduction.
+    """
+    xtry = np.add(x, d, out=out)
+    if oracle.fusedTrial:
+        ftry, gtry = oracle.valueAndGradient(xtry)
+    else:
+        ftry, gtry = oracle.value(xtry), None
+    return xtry, ftry, gtry, fx - ftry
 
 
-def acceptTrialPoint(xtry, ftry, Df, gx):
-    """Accept trial point and assign new values."""
-    gxNew = Df(xtry)
-    return xtry, ftry, gxNew, gxNew - gx
+def acceptTrialPoint(xtry, ftry, gtry, oracle, gx, out=None):
+    """
+    Accept trial point and assign new values (gradient difference into out if
+    given). The gradient is evaluated unless computeTrialPoint returned it.
+    """
+    gxNew = oracle.gradient(xtry) if gtry is None else gtry
+    return xtry, ftry, gxNew, np.subtract(gxNew, gx, out=out)
@@ -0,0 +1,234 @@
+"""
+Columnar store of benchmark results.
+
+A store is a directory with one raw binary file per column and a metadata
+file (meta.json). Every row holds the result of one algorithm/mode on one
+problem. The categorical columns mode, algorithm, problem, reason (why
+a cell failed, -1 if it did not; failed cells have nf = inf) and
+fingerprint (of the algorithm, see checkpoint.py; -1 for imported rows)
+hold integer codes into name lists kept in the metadata, and the run
+column refers to run records holding the parameter settings. Rows are
+only ever appended: the column files are extended first and the row
+count in the metadata, which is replaced atomically afterwards, marks the
+valid rows. If a cell is stored more than once, the most recent row is
+returned.
+
+Columns can be memory-mapped with `column`; `table` returns the
+algorithms x problems matrices of one mode, as used by the profile scripts.
+
+The store is generated data and not kept in the repository. `load` opens
+a store and, when it is created, first imports the legacy CSV files of
+its parent directory (results/*.csv for results/store). Running this
+module performs that import.
+"""
+import datetime
+import glob
+import json
+import os
+import numpy as np
+from . import parameters
+
+
+# Column name: (dtype, value for rows written before the column existed)
+defaultColumns = {
+    'mode': ('i4', -1),
+    'algorithm': ('i4', -1),
+    'problem': ('i4', -1),
+    'run': ('i4', -1),
+    'n': ('i8', -1),
+    'reason': ('i4', -1),
+    'fingerprint': ('i4', -1),
+    'nf': ('f8', np.nan),
+    'iter': ('i8', -1),
+    'fx': ('f8', np.nan),
+    'opt': ('f8', np.nan),
+    'time': ('f8', np.nan),          # median wall-clock time of the solve
+    'timeSpread': ('f8', np.nan),    # max - min of the wall-clock times
+    'cpuTime': ('f8', np.nan),       # median CPU time
+    'oracleTime': ('f8', np.nan),    # median time spent in the oracle
+    'overheadTime': ('f8', np.nan),  # median wall-clock time outside the oracle
+}
+categorical = 'mode', 'algorithm', 'problem', 'reason', 'fingerprint'
+
+
+def parameterSettings():
+    """Settings of the parameters file."""
+    return {k: v for k, v in vars(parameters).items()
+        if not k.startswith('_') and isinstance(v, (bool, int, float, str))}
+
+
+class Store:
+    """Append-only results store in the directory path (created if needed)."""
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(self.file('meta.json')):
+            with open(self.file('meta.json')) as file:
+                self.meta = json.load(file)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.meta = {'rows': 0, 'columns': {}, 'runs': [], **{key: [] for key in categorical}}
+            for name, (dtype, fill) in defaultColumns.items():
+                self.addColumn(name, dtype, fill)
+            self.writeMeta()
+
+    def file(self, name):
+        return os.path.join(self.path, name)
+
+    def writeMeta(self):
+        """Atomically replace the metadata file."""
+        with open(self.file('meta.json.tmp'), 'w') as file:
+            json.dump(self.meta, file, indent=1)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self.file('meta.json.tmp'), self.file('meta.json'))
+
+    def addColumn(self, name, dtype, fill):
+        """Add a column, filling the existing rows with fill."""
+        np.full(self.meta['rows'], fill, dtype=dtype).tofile(self.file(f"{name}.bin"))
+        self.meta['columns'][name] = [np.dtype(dtype).str, fill]
+
+    def code(self, key, name):
+        """Integer code of a name in a categorical column (added if new, -1 for None)."""
+        if name is None:
+            return -1
+        names = self.meta.setdefault(key, [])
+        if name not in names:
+            names.append(name)
+        return names.index(name)
+
+    def newRun(self, **info):
+        """Register a new run with the current parameter settings and return its code."""
+        self.meta['runs'].append({'time': datetime.datetime.now().isoformat(),
+            'parameters': parameterSettings(), **info})
+        self.writeMeta()
+        return len(self.meta['runs']) - 1
+
+    def append(self, run, mode, algorithm, problem, **values):
+        """
+        Append rows. mode, algorithm and problem (and reason, if given) are
+        names or sequences of names, the remaining keyword arguments are
+        column values; scalars are broadcast to the number of rows and
+        missing columns are filled.
+        """
+        values = {'mode': mode, 'algorithm': algorithm, 'problem': problem, 'run': run, **values}
+        for key in categorical:
+            if key in values:
+                values[key] = self.codes(key, values[key])
+        nRows = max(np.size(v) for v in values.values())
+        for name, value in values.items():
+            if name in defaultColumns and name not in self.meta['columns']:
+                self.addColumn(name, *defaultColumns[name])
+            elif name not in self.meta['columns']:
+                dtype = np.asarray(value).dtype
+                self.addColumn(name, dtype, np.nan if dtype.kind == 'f' else -1)
+        rows = self.meta['rows']
+        for name, (dtype, fill) in self.meta['columns'].items():
+            data = np.broadcast_to(np.asarray(values.get(name, fill), dtype=dtype), nRows)
+            with open(self.file(f"{name}.bin"), 'r+b') as file:
+                # Discard the tail of an interrupted append
+                file.truncate(rows * np.dtype(dtype).itemsize)
+                file.seek(0, os.SEEK_END)
+                data.tofile(file)
+                file.flush()
+                os.fsync(file.fileno())
+        self.meta['rows'] = rows + nRows
+        self.writeMeta()
+
+    def codes(self, key, names):
+        if names is None or isinstance(names, str):
+            return self.code(key, names)
+        return [self.code(key, name) for name in names]
+
+    def column(self, name):
+        """Memory-mapped (read-only) column."""
+        dtype = self.meta['columns'][name][0]
+        if self.meta['rows'] == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.file(f"{name}.bin"), dtype=dtype, mode='r',
+            shape=(self.meta['rows'],))
+
+    def cells(self):
+        """
+        Stored (fingerprint, mode, algorithm, problem) cells (by name), mapped
+        to whether their most recent row is a failure.
+        """
+        if 'fingerprint' not in self.meta['columns']:
+            return {}
+        names = [['' if code < 0 else self.meta[key][code] for code in self.column(key)]
+            for key in ('fingerprint', 'mode', 'algorithm', 'problem')]
+        return dict(zip(zip(*names), self.column('reason') >= 0))
+
+    def problems(self):
+        """Names of all stored problems."""
+        return list(self.meta['problem'])
+
+    def runs(self, **info):
+        """Codes of the runs whose records have the given values (e.g. storage='float32')."""
+        return [code for code, record in enumerate(self.meta['runs'])
+            if all(record.get(key) == value for key, value in info.items())]
+
+    def table(self, mode, algorithms, *names, problems=None, runs=None):
+        """
+        Matrices (algorithms x problems) of the named columns for one mode,
+        as float arrays with NaN for missing cells (and columns). problems
+        defaults to all stored problems, runs (codes) to all runs. A single
+        name returns a single matrix.
+        """
+        problems = self.problems() if problems is None else problems
+        algIndex = np.full(len(self.meta['algorithm']) + 1, -1)
+        algIndex[[self.meta['algorithm'].index(a) for a in algorithms]] = np.arange(len(algorithms))
+        probIndex = np.full(len(self.meta['problem']) + 1, -1)
+        probIndex[[self.meta['problem'].index(p) for p in problems]] = np.arange(len(problems))
+        i = algIndex[self.column('algorithm')]
+        j = probIndex[self.column('problem')]
+        selected = (self.column('mode') == self.meta['mode'].index(mode)) & (i >= 0) & (j >= 0)
+        if runs is not None:
+            selected &= np.isin(self.column('run'), runs)
+        rows = np.flatnonzero(selected)
+
+        # Keep the most recent row of every cell
+        _, last = np.unique((i[rows] * len(problems) + j[rows])[::-1], return_index=True)
+        rows = rows[::-1][last]
+
+        tables = []
+        for name in names:
+            table = np.full((len(algorithms), len(problems)), np.nan)
+            if name in self.meta['columns']:
+                table[i[rows], j[rows]] = self.column(name)[rows]
+            tables.append(table)
+        return tables[0] if len(names) == 1 else tables
+
+
+def importLegacy(store, directory, problems):
+    """
+    Append the CSV files <algorithm>_<mode>.csv (columns nf, iter, fx, opt)
+    and lmtr.csv (columns iter, nf, fx, opt, stored as eigLBFGS/solve) in
+    directory. The rows are matched with problems in order.
+    """
+    run = store.newRun(source=f"CSV import from {directory}", parameters=None)
+    for path in sorted(glob.glob(os.path.join(directory, '*_*.csv'))):
+        algorithm, mode = os.path.basename(path)[:-4].split('_')
+        nf, iter, fx, opt = np.loadtxt(path, delimiter=',', ndmin=2).T
+        store.append(run, mode, algorithm, problems, nf=nf, iter=iter, fx=fx, opt=opt)
+    lmtrPath = os.path.join(directory, 'lmtr.csv')
+    if os.path.exists(lmtrPath):
+        iter, nf, fx, opt = np.loadtxt(lmtrPath, delimiter=',', ndmin=2).T
+        store.append(run, 'solve', 'eigLBFGS', problems, nf=nf, iter=iter, fx=fx, opt=opt)
+
+
+def load(path='results/store'):
+    """
+    Open the store at path. A new store is first filled with the legacy CSV
+    files in the parent directory of path (if there are any).
+    """
+    from .problems import problemsToRun
+    new = not os.path.exists(os.path.join(path, 'meta.json'))
+    store = Store(path)
+    directory = os.path.dirname(os.path.normpath(path))
+    if new and glob.glob(os.path.join(directory, '*_*.csv')):
+        importLegacy(store, directory, problemsToRun())
+    return store
+
+
+if __name__ == '__main__':
+    load()
@@ -0,0 +1,189 @@
+"""
+Task scheduler for the benchmark runner.
+
+Every task is a tuple whose first entry names the problem it belongs to.
+Each worker process keeps the most recently used problems in an LRU cache
+(loading a problem may require a costly import/link step and the loaded
+objects cannot be sent between processes), and the coordinator routes
+tasks to workers which already hold the corresponding problem. Among the
+eligible tasks, the one listed first is chosen, so tasks should be passed
+longest first. Workers are started by forking, so `load` and `solve` may
+be arbitrary callables. The (picklable) return value of `solve` is sent
+back to the coordinator, which reports it as soon as the task completes.
+
+Every worker communicates through its own pipe, so a worker which exceeds
+the timeout or dies (e.g., killed for running out of memory) can be
+killed and replaced without affecting the others; its task is reported
+as failed.
+
+Tasks can also be obtained while running (e.g., from a coordinator, see
+utility.cluster): `refill` is then asked for new tasks whenever workers
+are idle and no task is pending.
+"""
+import multiprocessing
+import multiprocessing.connection
+import time
+import traceback
+from collections import OrderedDict
+
+
+class LruCache:
+    """Least-recently-used cache of loaded problems."""
+    def __init__(self, size, load):
+        self.size = size
+        self.load = load
+        self.entries = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Return the entry for key, loading it (and evicting the oldest entry) if needed."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        else:
+            self.entries[key] = self.load(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return self.entries[key]
+
+
+def workerLoop(load, solve, cacheSize, conn):
+    """Worker process: solve tasks until a None sentinel is received."""
+    cache = LruCache(cacheSize, load)
+    for task in iter(conn.recv, None):
+        try:
+            conn.send((task, solve(cache.get(task[0]), task), None))
+        except Exception:
+            conn.send((task, None, traceback.format_exc()))
+
+
+class Worker:
+    """Coordinator-side handle of a worker process."""
+    def __init__(self, context, load, solve, cacheSize):
+        self.conn, childConn = context.Pipe()
+        self.process = context.Process(target=workerLoop, args=(load, solve, cacheSize, childConn))
+        self.process.start()
+        childConn.close()
+        self.cache = LruCache(cacheSize, lambda key: None)  # Mirror of the worker's cache
+        self.task = None
+        self.start = None
+
+    def send(self, task):
+        self.cache.get(task[0])
+        self.task, self.start = task, time.monotonic()
+        self.conn.send(task)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class Scheduler:
+    """
+    Distribute tasks over worker processes with problem affinity.
+
+    load : function mapping a problem key to the loaded problem.
+    solve : function solve(problem, task) called in the worker.
+    nWorkers : number of worker processes (defaults to the number of cores).
+    cacheSize : number of problems kept loaded in every worker.
+    timeout : wall-clock limit per task in seconds (None for no limit).
+    """
+    # Seconds between requests for new tasks if refill has none at the moment
+    pollInterval = 5
+
+    def __init__(self, load, solve, nWorkers=None, cacheSize=2, timeout=None):
+        self.load = load
+        self.solve = solve
+        self.nWorkers = nWorkers or multiprocessing.cpu_count()
+        self.cacheSize = cacheSize
+        self.timeout = timeout
+        self.context = multiprocessing.get_context('fork')
+
+    def newWorker(self):
+        return Worker(self.context, self.load, self.solve, self.cacheSize)
+
+    def pick(self, pending, worker, workers):
+        """Choose the next task for worker and remove it from pending."""
+        # 1. A task for a problem which the worker already holds
+        for i, task in enumerate(pending):
+            if task[0] in worker.cache:
+                return pending.pop(i)
+        # 2. A task for a problem which no worker holds yet
+        for i, task in enumerate(pending):
+            if not any(task[0] in other.cache for other in workers):
+                return pending.pop(i)
+        # 3. Help with the first remaining task
+        return pending.pop(0)
+
+    def run(self, tasks, report=None, refill=None):
+        """
+        Solve all tasks and return a list of (task, error) for the failed ones.
+        report(task, result, error) is called in the coordinator for every
+        task as soon as it is completed, with error None on success.
+        refill(n) is called when n workers are idle and no task is pending;
+        it returns a list of at most n new tasks (possibly empty), or None
+        if no more tasks will come.
+        """
+        pending = list(tasks)
+        workers = [self.newWorker() for _ in range(self.nWorkers)]
+        failed = []
+
+        def complete(task, result, error):
+            if error is not None:
+                print(f"Task {task} failed:\n{error}")
+                failed.append((task, error))
+            if report is not None:
+                report(task, result, error)
+
+        while True:
+            idle = sum(worker.task is None for worker in workers)
+            if refill is not None and idle and not pending:
+                more = refill(idle)
+                if more is None:
+                    refill = None
+                else:
+                    pending.extend(more)
+            for worker in workers:
+                if worker.task is None and pending:
+                    worker.send(self.pick(pending, worker, workers))
+            busy = [worker for worker in workers if worker.task is not None]
+            if not busy and refill is None:
+                break
+
+            # Wait for a result, a dead worker, the next deadline or the next refill
+            timeout = None
+            if self.timeout is not None and busy:
+                timeout = max(0, min(w.start for w in busy) + self.timeout - time.monotonic())
+            if refill is not None and any(worker.task is None for worker in workers):
+                timeout = self.pollInterval if timeout is None else min(timeout, self.pollInterval)
+            ready = multiprocessing.connection.wait(
+                [w.conn for w in busy] + [w.process.sentinel for w in busy], timeout)
+
+            for i, worker in enumerate(workers):
+                if worker.task is None:
+                    continue
+                message = None
+                if worker.conn in ready:
+                    try:
+                        message = worker.conn.recv()
+                    except EOFError:
+                        pass
+                died = worker.conn in ready or worker.process.sentinel in ready
+                if message is not None:
+                    worker.task = None
+                    complete(*message)
+                elif died or (self.timeout is not None and time.monotonic() - worker.start >= self.timeout):
+                    worker.kill()
+                    if died:
+                        error = f"Worker died with exit code {worker.process.exitcode}"
+                    else:
+                        error = f"Timeout after {self.timeout} seconds"
+                    workers[i] = self.newWorker()
+                    complete(worker.task, None, error)
+
+        for worker in workers:
+            worker.conn.send(None)
+            worker.process.join()
+        return failed
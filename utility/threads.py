@@ -0,0 +1,100 @@
+"""
+Layout of worker processes and BLAS threads for the benchmark runner.
+
+Every worker process runs its own NumPy/BLAS, which by default starts one
+thread per core, so a pool with one process per core oversubscribes the
+machine. A layout (processes, threads) with processes * threads <= cores
+is chosen from the problem dimension: the limited-memory kernels are
+products with m x n matrices, which only profit from threads for large n.
+The limits are passed to the BLAS libraries through environment variables
+and therefore have to be set before NumPy is imported (the workers inherit
+them). This module does not import NumPy. If NumPy was already imported,
+the limits are applied with threadpoolctl if available.
+
+One layout for the largest problem would make a single large problem
+force threads (and fewer workers) on all small ones. `plan` therefore
+groups the problems into size classes with a layout each; the workers of
+a class lower their BLAS threads with threadpoolctl. Without
+threadpoolctl, the thread count cannot change after the import of NumPy,
+and a single layout for the largest problem is used.
+"""
+import importlib.util
+import os
+import sys
+
+
+# Environment variables read by the BLAS/OpenMP runtimes when they start
+variables = 'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', \
+    'BLIS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS'
+
+# Smallest problem dimension per BLAS thread in the automatic layout
+dimensionPerThread = 100000
+
+
+def cores():
+    """Number of cores available to this process."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def layout(maxDimension, nCores=None, processes=None, threads=None):
+    """
+    Return (processes, threads). Unspecified entries are chosen such that
+    processes * threads <= nCores, with one thread per dimensionPerThread
+    variables of the largest problem.
+    """
+    nCores = nCores or cores()
+    if threads is None:
+        if processes is None:
+            threads = min(nCores, max(1, maxDimension // dimensionPerThread))
+        else:
+            threads = max(1, nCores // processes)
+    if processes is None:
+        processes = max(1, nCores // threads)
+    return processes, threads
+
+
+def plan(dimensions, nCores=None, processes=None, threads=None):
+    """
+    Layouts for the problems with the given dimensions (dict name -> n), as
+    list of (processes, threads, problems) with the most threads first.
+    If processes or threads are given, or the threads cannot be adjusted
+    after the import of NumPy, all problems share the layout of the largest.
+    """
+    nCores = nCores or cores()
+    largest = max(dimensions.values())
+    if processes is not None or threads is not None or not adjustable():
+        return [(*layout(largest, nCores, processes, threads), list(dimensions))]
+    classes = {}
+    for problem, n in dimensions.items():
+        classes.setdefault(layout(n, nCores), []).append(problem)
+    return [(*key, problems) for key, problems in sorted(classes.items(), key=lambda item: -item[0][1])]
+
+
+def adjustable():
+    """Whether the BLAS threads can be changed after the import of NumPy (threadpoolctl)."""
+    return importlib.util.find_spec('threadpoolctl') is not None
+
+
+def limit(threads):
+    """Limit the BLAS threads of this process (must precede the import of NumPy)."""
+    for name in variables:
+        os.environ[name] = str(threads)
+    if 'numpy' in sys.modules:
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            print(f"Warning: NumPy already imported, BLAS threads not limited to {threads}")
+            return
+        threadpool_limits(threads)
+
+
+def info():
+    """Thread pools of the loaded BLAS/OpenMP libraries (empty without threadpoolctl)."""
+    try:
+        from threadpoolctl import threadpool_info
+    except ImportError:
+        return []
+    return [{key: pool.get(key) for key in ('internal_api', 'version', 'num_threads')}
+        for pool in threadpool_info()]
@@ -0,0 +1,83 @@
+"""
+Per-iteration tracing of the generic algorithms.
+
+The generic drivers accept an optional tracer which is informed at the
+beginning of every iteration (begin), after the search direction has been
+computed (endDirection), and once the iteration or rejected trial step is
+complete (record). Any object with these methods can be used as a tracer;
+without a tracer the drivers skip all of this bookkeeping.
+
+Tracer stores the records in a preallocated structured array and appends
+it to a binary file whenever it is full. Such a file can be read (or
+memory-mapped) with `load`.
+"""
+import time
+import numpy as np
+
+
+traceDtype = np.dtype([
+    ('iter', 'i8'),         # number of accepted steps
+    ('nf', 'i8'),           # number of function evaluations
+    ('fx', 'f8'),           # function value after the iteration
+    ('gnorm', 'f8'),        # infinity norm of the gradient after the iteration
+    ('mu', 'f8'),           # regularization parameter of the trial step (NaN for line searches)
+    ('dnorm', 'f8'),        # norm of the search direction
+    ('pred', 'f8'),         # predicted reduction (NaN for line searches)
+    ('ared', 'f8'),         # actual reduction (NaN if no trial point was evaluated)
+    ('accepted', '?'),      # whether the step was accepted
+    ('tDirection', 'f8'),   # time spent in the direction calculator
+    ('tOracle', 'f8'),      # time spent in the oracle
+])
+
+
+class Tracer:
+    """Append-only binary trace of one run."""
+    def __init__(self, path, capacity=4096):
+        self.file = open(path, 'wb')
+        self.buffer = np.zeros(capacity, dtype=traceDtype)
+        self.size = 0
+        self.oracle = None
+        self.tBegin = self.tDirection = self.oracleTime = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def begin(self, oracle):
+        """Start timing an iteration."""
+        oracle.enableTiming()
+        self.oracle = oracle
+        self.oracleTime = oracle.time
+        self.tBegin = self.tDirection = time.perf_counter()
+
+    def endDirection(self):
+        """Mark the end of the direction computation."""
+        self.tDirection = time.perf_counter()
+
+    def record(self, iter, fx, gx, mu, d, pred, ared, accepted):
+        """Record a completed iteration or rejected trial step."""
+        if self.size == len(self.buffer):
+            self.flush()
+        self.buffer[self.size] = (iter[0], iter[1], fx, np.linalg.norm(gx, np.inf), mu,
+            np.linalg.norm(d), pred, ared, accepted, self.tDirection - self.tBegin,
+            self.oracle.time - self.oracleTime)
+        self.size += 1
+
+    def flush(self):
+        """Append the buffered records to the file."""
+        self.buffer[:self.size].tofile(self.file)
+        self.file.flush()
+        self.size = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def load(path, mmap=True):
+    """Read a trace file as structured array (memory-mapped by default)."""
+    if mmap:
+        return np.memmap(path, dtype=traceDtype, mode='r')
+    return np.fromfile(path, dtype=traceDtype)
@@ -0,0 +1,35 @@
+"""
+Preallocated n-sized buffers of one solve.
+
+Every limited-memory data structure owns a workspace (`lmData.workspace`)
+through which the drivers, line searches and direction calculators obtain
+their n-sized temporaries, so the iterations do not allocate such arrays.
+The buffers used are:
+  * 'd': the search direction returned by the direction calculators,
+  * 'tmp': scratch space of the direction calculators,
+  * 'xtry': the trial point (exchanged with 'x' when it is accepted),
+  * 's', 'y': the differences of iterates and gradients of a step.
+
+A buffer is overwritten by the next computation which uses it. Arrays
+returned by the oracle (which may be cached) are never written to, and
+the oracle must not keep references to its argument.
+"""
+import numpy as np
+
+
+class Workspace:
+    """Named buffers of length n, allocated on first use."""
+    def __init__(self, n):
+        self.n = n
+        self.buffers = {}
+
+    def __call__(self, name):
+        """Buffer with the given name."""
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            buffer = self.buffers[name] = np.empty(self.n)
+        return buffer
+
+    def swap(self, a, b):
+        """Exchange the buffers named a and b."""
+        self.buffers[a], self.buffers[b] = self(b), self(a)
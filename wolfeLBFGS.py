@@ -1,20 +1,21 @@
 """
 Monotone and nonmonotone L-BFGS algorithms with Wolfe line search.
 """
+import functools
 import numpy as np
 from utility import linesearch, morethuente, parameters, limitedMemory
 
 
-def solve(f, Df, x):
+def solve(oracle, x, tracer=None):
     """Monotone L-BFGS algorithm with Wolfe line search."""
     lmData = limitedMemory.LmData(x.shape[0], parameters.memory)
-    return linesearch.genericMonotone(lmData, updateLmData, inverseBFGS, wolfe, f, Df, x)
+    return linesearch.genericMonotone(lmData, updateLmData, inverseBFGS, wolfeSearch(x.shape[0]), oracle, x, tracer)
 
 
-def solveNonmonotone(f, Df, x):
+def solveNonmonotone(oracle, x, history=None, tracer=None):
     """Nonmonotone L-BFGS algorithm with Wolfe line search."""
     lmData = limitedMemory.LmData(x.shape[0], parameters.memory)
-    return linesearch.genericNonmonotone(lmData, updateLmData, inverseBFGS, wolfe, f, Df, x)
+    return linesearch.genericNonmonotone(lmData, updateLmData, inverseBFGS, wolfeSearch(x.shape[0]), oracle, x, history, tracer)
 
 
 def updateLmData(lmData, sn, yn):
@@ -27,19 +28,24 @@ def updateLmData(lmData, sn, yn):
 
 def inverseBFGS(data, g):
     """Compute L-BFGS search direction."""
-    return limitedMemory.twoLoopRecursion(data.S, data.Y, data.sty, data.mUpd, data.gamma, -g)
+    d = np.negative(g, out=data.workspace('d'))
+    return limitedMemory.twoLoopRecursion(data.S, data.Y, data.sty, data.order(), data.gamma, d, d,
+        data.workspace('tmp'))
 
 
-def wolfe(x, f, Df, d, fx, gx):
-    """Perform Wolfe line-search by calling DCSRCH from MINPACK."""
-    fun = lambda x: (f(x), Df(x))
+def wolfeSearch(n):
+    """Wolfe line search with a More-Thuente search object reused across iterations."""
+    return functools.partial(wolfe, morethuente.LineSearch(n, 1e-4, 0.9, 1e-16, 1e-20, 1e20, 20))
+
 
-    xn,fn,gn,t,exls,it = \
-        morethuente.cvsrch(fun,len(x),x,fx,gx,d,1,1e-4,0.9,1e-16,1e-20,1e20,20)
+def wolfe(search, x, oracle, d, fx, gx, workspace):
+    """Perform Wolfe line-search by calling DCSRCH from MINPACK."""
+    xn,fn,gn,t,exls,it = search(oracle,x,fx,gx,d,1,workspace('xtry'))
     
     if exls != 1:
         # Unsucessful
         return x, False, fx, gx, it, np.zeros_like(d), np.zeros_like(gx)
     else:
         # Successful
-        return xn, True, fn, gn, it, t * d, gn - gx
+        sn = np.multiply(d, t, out=workspace('s'))
+        return xn, True, fn, gn, it, sn, np.subtract(gn, gx, out=workspace('y'))